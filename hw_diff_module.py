@@ -10,6 +10,13 @@ from pathlib import Path
 from typing import Dict, List, Any, Tuple
 from datetime import datetime
 
+# orjson - опциональный быстрый сериализатор JSON
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Безопасный импорт функций сбора данных
 try:
     from create_baseline_config import get_cpu_info, get_memory_info, get_pci_info, get_usb_info, get_storage_info
@@ -1250,8 +1257,12 @@ class HardwareDiff:
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
         
-        with output_file.open('w', encoding='utf-8') as f:
-            json.dump(self.diff_results, f, ensure_ascii=False, indent=2)
+        if ORJSON_AVAILABLE:
+            output_file.write_bytes(orjson.dumps(self.diff_results,
+                                                 option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        else:
+            output_file.write_text(json.dumps(self.diff_results, ensure_ascii=False, indent=2),
+                                   encoding='utf-8')
         
         print(f"📄 Отчет HW-Diff сохранен: {output_file}")
 
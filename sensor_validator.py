@@ -547,8 +547,15 @@ class SensorValidator:
         
         return discrete_results
     
-    def perform_full_validation(self, conf: Dict[str, str]) -> Dict:
-        """Выполнение полной валидации всех сенсоров с обработкой ошибок"""
+    def perform_full_validation(self, conf: Dict[str, str],
+                                sensors: Optional[Dict[str, Dict]] = None) -> Dict:
+        """Выполнение полной валидации всех сенсоров с обработкой ошибок
+        
+        Args:
+            conf: Конфигурация с параметрами BMC
+            sensors: Уже собранные данные сенсоров {sensor_name: {value, unit, status}};
+                     если не переданы - собираются через collect_sensor_data
+        """
         print("🔍 Запуск полной валидации сенсоров BMC...")
         
         validation_results = {
@@ -573,7 +580,8 @@ class SensorValidator:
         try:
             # Сбор данных сенсоров с обработкой ошибок
             try:
-                sensors = self.collect_sensor_data(conf)
+                if sensors is None:
+                    sensors = self.collect_sensor_data(conf)
                 validation_results['validation_info']['total_sensors_available'] = len(sensors)
                 validation_results['raw_sensor_data'] = sensors
             except Exception as sensor_error:
@@ -671,8 +679,8 @@ class SensorValidator:
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
         
-        with output_file.open('w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        # json.dump пишет в файл сотнями мелких фрагментов; строка целиком - одна запись
+        output_file.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
         
         print(f"📄 Отчет валидации сенсоров сохранен: {output_file}")
 
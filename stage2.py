@@ -12,6 +12,7 @@
 
 import subprocess
 import json
+import copy
 import os
 import sys
 import time
@@ -21,9 +22,33 @@ import shutil
 import glob
 import re
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Iterable
+from typing import Dict, List, Any, Optional, Iterable, Tuple
 import secrets
 import random
+import select
+import signal
+import threading
+import functools
+import logging
+import itertools
+import mmap
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, asdict, is_dataclass
+from collections import Counter, defaultdict
+
+# orjson - опциональный быстрый парсер/сериализатор JSON
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# smbus2 - опциональный прямой доступ к /dev/i2c-N без запуска i2cdetect
+try:
+    import smbus2
+    SMBUS2_AVAILABLE = True
+except ImportError:
+    SMBUS2_AVAILABLE = False
 
 # Импорт модуля HW-Diff
 try:
@@ -39,34 +64,99 @@ try:
 except ImportError:
     SENSOR_VALIDATOR_AVAILABLE = False
 
-CONF_PATH = Path(__file__).parent / 'agent.conf'
-REF_ROOT  = Path(__file__).parent / 'reference'
+# Каталог скрипта: конфиг, эталоны и logs/ разрешаются от него один раз при импорте
+SCRIPT_DIR = Path(__file__).resolve().parent
+CONF_PATH = SCRIPT_DIR / 'agent.conf'
+REF_ROOT  = SCRIPT_DIR / 'reference'
+# Обязательные параметры agent.conf
+_CONF_REQUIRED_KEYS = ('bmc_ip', 'bmc_user', 'bmc_pass', 'test_user', 'test_pass')
+# Эталонные файлы: QVL прошивок, инвентарь платы, пределы сенсоров
+QVL_PATH        = REF_ROOT / 'firmware_versions.json'
+INVENTORY_PATH  = REF_ROOT / 'inventory_RSMB-MS93.json'
+SENSOR_REF_PATH = REF_ROOT / 'sensor_limits.json'
+
+# Строка "Product Serial        : GOG4NG221A0030" в `fru print` (байты): значение
+_FRU_SERIAL_RE = re.compile(rb'^[^:\n]*Product Serial[^:\n]*:([^:\n]*)', re.MULTILINE)
 
 # Получаем серийный номер из FRU и создаем папку логов
 def get_serial_from_fru(conf):
-    """Получение серийного номера из FRU данных BMC"""
+    """Получение серийного номера из FRU данных BMC.
+
+    Вывод ipmitool разбирается как байты: декодируется только найденное значение.
+    """
     try:
-        result = subprocess.run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-                               '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-                               'fru', 'print', '1'], capture_output=True, text=True, timeout=30)
-        if result.returncode == 0:
-            for line in result.stdout.splitlines():
-                if 'Product Serial' in line:
-                    # Парсим строку "Product Serial        : GOG4NG221A0030"
-                    serial = line.split(':')[1].strip()
-                    return serial if serial and serial != 'UNKNOWN_SERIAL' else 'UNKNOWN_SERIAL'
+        if IPMI_SESSION is not None and IPMI_SESSION.alive:
+            fru_out = IPMI_SESSION.exec(['fru', 'print', '1'], timeout=ipmi_timeout(['fru'])).encode('utf-8')
+        else:
+            result = subprocess.run([*BmcConf.from_conf(conf).ipmi_prefix, 'fru', 'print', '1'],
+                                    capture_output=True, timeout=ipmi_timeout(['fru']))
+            if result.returncode != 0:
+                return 'UNKNOWN_SERIAL'
+            fru_out = result.stdout
+        m = _FRU_SERIAL_RE.search(fru_out)
+        if m:
+            serial = m.group(1).strip().decode('utf-8', errors='replace')
+            return serial if serial and serial != 'UNKNOWN_SERIAL' else 'UNKNOWN_SERIAL'
         return 'UNKNOWN_SERIAL'
-    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, json.JSONDecodeError, KeyError) as e:
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, RuntimeError, json.JSONDecodeError, KeyError) as e:
         print(f"⚠️  Ошибка при получении серийного номера: {type(e).__name__}: {e}")
         return 'UNKNOWN_SERIAL'
 
 # LOG_ROOT будет инициализирован в main() после получения конфигурации
 LOG_ROOT = None  # Будет установлено в main()
+# Отладочные сообщения (включаются переменной окружения STAGE2_DEBUG=1)
+logger = logging.getLogger('stage2')
+
+# Строковые пути логов для RESULT_JSON['logs'] по имени файла (LOG_ROOT задаётся один раз)
+_LOG_PATHS: Dict[str, str] = {}
+
+def log_path(name: str) -> str:
+    """Путь лога в LOG_ROOT строкой для отчёта, вычисляется один раз на имя"""
+    path = _LOG_PATHS.get(name)
+    if path is None:
+        path = _LOG_PATHS[name] = f'{LOG_ROOT}/{name}'
+    return path
+
+# Общая сессия ipmitool shell, открывается в main()
+IPMI_SESSION = None
+
+# Время старта хранится и как datetime - длительность считается без разбора ISO строк
+_START_DT = dt.datetime.now(timezone.utc)
+
+# Предел длительности всех шагов прогона (сек) по умолчанию, в agent.conf - max_run_sec:
+# зависший BMC или утилита не держат стенд бесконечно, отчёт с уже полученными
+# результатами всё равно пишется
+_MAX_RUN_SEC = 1800
+
+class RunTimeout(BaseException):
+    """Превышено общее время прогона.
+
+    Наследник BaseException: не перехватывается обработчиками `except Exception`
+    в шагах и `except OSError` в IpmiSession.exec, доходит до main().
+    """
+
+def _run_watchdog(signum, frame):
+    """Обработчик SIGALRM: прерывает выполнение шагов в главном потоке"""
+    raise RunTimeout('Превышено общее время прогона, шаги прерваны')
+
+def _snapshot_result_json() -> Dict[str, Any]:
+    """Копия RESULT_JSON для отчёта, пока потоки прерванных шагов ещё могут его менять.
+
+    На время deepcopy интервал переключения GIL увеличивается: копирование не
+    выполняет ввода-вывода, поэтому потоки шагов не получают управление и не
+    изменяют словари посреди обхода.
+    """
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(60)
+    try:
+        return copy.deepcopy(RESULT_JSON)
+    finally:
+        sys.setswitchinterval(interval)
 
 RESULT_JSON = {
     'serial'   : None,
     'stage'    : '2',
-    'start'    : dt.datetime.now(timezone.utc).isoformat(),
+    'start'    : _START_DT.isoformat(),
     'results'  : {},
     'warnings' : [],
     'logs'     : {}
@@ -74,11 +164,61 @@ RESULT_JSON = {
 
 # ---------- utility helpers -------------------------------------------------
 
+class StepConsole:
+    """stdout на время параллельной группы шагов (run_concurrently).
+
+    Вывод каждого шага копится в буфере его потока и выводится одним блоком
+    по завершении шага, чтобы строки параллельных шагов не перемешивались.
+    Строки START (write_now) выводятся сразу - оператор видит начало долгих шагов.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is not None:
+            buffer.append(text)
+            return len(text)
+        with self._lock:
+            return self.stream.write(text)
+
+    def flush(self) -> None:
+        if getattr(self._local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def write_now(self, text: str) -> None:
+        """Вывод в консоль сразу, минуя буфер шага"""
+        with self._lock:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def run(self, fn, *args):
+        """Вызов шага с буферизацией его вывода"""
+        self._local.buffer = []
+        try:
+            return fn(*args)
+        finally:
+            text = ''.join(self._local.buffer)
+            self._local.buffer = None
+            if text:
+                self.write_now(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
 def print_step(step_name: str, status: str = "START"):
     """Вывод информации о текущем этапе"""
-    timestamp = dt.datetime.now(timezone.utc).strftime('%H:%M:%S')
+    timestamp = time.strftime('%H:%M:%S', time.gmtime())
     if status == "START":
-        print(f"[{timestamp}] 🔄 {step_name}...")
+        line = f"[{timestamp}] 🔄 {step_name}..."
+        if isinstance(sys.stdout, StepConsole):
+            # Начало шага в параллельной группе выводится сразу, остальное - блоком по завершении
+            sys.stdout.write_now(line + '\n')
+            return
+        print(line)
     elif status == "PASS":
         print(f"[{timestamp}] ✅ {step_name} - PASS")
     elif status == "FAIL":
@@ -87,23 +227,32 @@ def print_step(step_name: str, status: str = "START"):
         print(f"[{timestamp}] ⚠️  {step_name} - WARNING")
     sys.stdout.flush()
 
-def check_dependencies():
-    """Проверяет наличие необходимых инструментов"""
+@functools.lru_cache(maxsize=1)
+def check_dependencies() -> tuple:
+    """Возвращает кортеж отсутствующих в PATH инструментов (результат кэшируется)"""
     tools = [
         'ipmitool', 'dmidecode', 'lshw', 'lspci', 'lsusb', 'lsblk',
         'stress-ng', 'hdparm', 'smartctl', 'fio', 'ethtool', 'i2cdetect'
     ]
     
-    missing = []
-    for tool in tools:
-        if not shutil.which(tool):
-            missing.append(tool)
-    
-    if missing:
-        raise RuntimeError(f"Отсутствуют инструменты: {', '.join(missing)}")
+    # Один проход по каталогам PATH вместо shutil.which на каждый инструмент
+    # Как shutil.which: каталог или неисполняемый файл с именем инструмента
+    # не засчитывается, поиск продолжается в следующих каталогах PATH
+    wanted = set(tools)
+    found = set()
+    for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        try:
+            with os.scandir(directory or '.') as it:
+                for entry in it:
+                    if entry.name in wanted and entry.name not in found and \
+                            entry.is_file() and os.access(entry.path, os.X_OK):
+                        found.add(entry.name)
+        except OSError:
+            continue
     
-    print("✓ Все необходимые инструменты найдены")
+    return tuple(tool for tool in tools if tool not in found)
 
+@functools.lru_cache(maxsize=1)
 def get_primary_network_interface():
     """Определение основного сетевого интерфейса"""
     try:
@@ -124,11 +273,27 @@ def get_primary_network_interface():
         print(f"⚠️  Ошибка при определении сетевого интерфейса: {type(e).__name__}: {e}")
         return 'eth0'
 
+# Маскирование паролей в командах для логов
+_MASK_P = re.compile(r'(-P\s+)(\S+)')
+_MASK_p = re.compile(r'(-p\s+)(\S+)')
+_MASK_PW = re.compile(r'(password[=:]\s*)(\S+)')
+_MASK_USER_PW = re.compile(r'(user set password\s+\d+\s+)(\S+)')
+
+def mask_cmd(cmd: List[str]) -> str:
+    """Строка команды для логов и исключений с замаскированными паролями"""
+    cmd_str = _MASK_PW.sub(r'\1******', _MASK_p.sub(r'\1******', _MASK_P.sub(r'\1******', ' '.join(cmd))))
+    return _MASK_USER_PW.sub(r'\1******', cmd_str)
+
 def run(cmd: List[str],
         log_file: Path,
         timeout: int = 300,
         accept_rc: Optional[Iterable[int]] = None) -> str:
-    """Run shell command, capture stdout+stderr, write to log_file, return stdout."""
+    """Run shell command, capture stdout+stderr, write to log_file, return stdout.
+
+    Вывод процесса идёт напрямую в лог (stdout=файл), затем из лога читается
+    только что записанный фрагмент. Один лог не должен использоваться
+    параллельными вызовами run().
+    """
     
     # Безопасная инициализация accept_rc
     if accept_rc is None:
@@ -136,62 +301,398 @@ def run(cmd: List[str],
     else:
         accept_rc = tuple(accept_rc)  # Преобразуем в неизменяемый tuple
     
-    # Инициализируем proc перед try блоком для избежания UnboundLocalError
-    proc = None
+    # Маскируем пароли один раз - эта строка идёт и в лог, и в тексты исключений
+    cmd_str = mask_cmd(cmd)
     
-    try:
-        # Маскируем пароли в команде для логирования
-        cmd_str = ' '.join(cmd)
-        cmd_str = re.sub(r'(-P\s+)(\S+)', r'\1******', cmd_str)
-        cmd_str = re.sub(r'(-p\s+)(\S+)', r'\1******', cmd_str)
-        cmd_str = re.sub(r'(password[=:]\s*)(\S+)', r'\1******', cmd_str)
-        
+    # Лог открывается один раз на весь вызов: заголовок, вывод процесса и ошибка
+    with open(log_file, 'a+b') as f:
         # Записываем команду в лог
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(f">>> {cmd_str}\n")
-        
-        # Запускаем процесс
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                               text=True, encoding='utf-8', errors='replace')
-        
-        # Ожидаем завершения с timeout
-        stdout, _ = proc.communicate(timeout=timeout)
+        f.write(f">>> {cmd_str}\n".encode('utf-8'))
+        f.flush()
+        start = f.tell()
         
-        # Записываем результат в лог
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(stdout)
-            f.write('\n')
-        
-        # Проверяем код возврата
-        if proc.returncode not in accept_rc:
-            raise RuntimeError(f"Command {cmd_str} exit {proc.returncode}, see {log_file}")
-        
-        return stdout.strip()
-        
-    except subprocess.TimeoutExpired:
-        if proc is not None:  # Проверяем что proc был создан
-            proc.kill()
+        try:
+            # Процесс пишет в лог сам; subprocess.run убивает его по timeout
+            proc = subprocess.run(cmd, stdout=f, stderr=subprocess.STDOUT, timeout=timeout)
+            
+            # Читаем из лога только вывод этой команды
+            f.seek(start)
+            stdout = f.read().decode('utf-8', errors='replace')
+            f.write(b'\n')
+            
+            # Проверяем код возврата
+            if proc.returncode not in accept_rc:
+                raise RuntimeError(f"Command {cmd_str} exit {proc.returncode}, see {log_file}")
+            
+            return stdout.strip()
+            
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"Command {cmd_str} timed out after {timeout}s")
+        except FileNotFoundError as e:
+            raise RuntimeError(f"Command not found: {cmd[0]}. Error: {e}")
+        except Exception as e:
+            f.write(f"ERROR: {e}\n".encode('utf-8'))
+            raise
+
+# ---------- IPMI session ----------------------------------------------------
+
+@dataclass(frozen=True)
+class BmcConf:
+    """Параметры доступа к BMC и готовый префикс команды ipmitool lanplus"""
+    bmc_ip: str
+    bmc_user: str
+    bmc_pass: str = field(repr=False)
+    ipmi_prefix: tuple = field(init=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'ipmi_prefix', ('ipmitool', '-I', 'lanplus', '-H', self.bmc_ip,
+                                                 '-U', self.bmc_user, '-P', self.bmc_pass))
+
+    @classmethod
+    def from_conf(cls, conf: Dict[str, Any]) -> 'BmcConf':
+        return cls(conf['bmc_ip'], conf['bmc_user'], conf['bmc_pass'])
+
+class IpmiSession:
+    """Постоянная сессия `ipmitool shell` к BMC через lanplus.
+
+    Каждый отдельный запуск ipmitool заново устанавливает RMCP+ сессию
+    (1-3 сек на рукопожатие). Здесь один процесс ipmitool shell живёт весь
+    прогон, команды передаются ему через stdin, ответ читается до приглашения.
+    """
+
+    PROMPT = b'ipmitool> '
+
+    def __init__(self, bmc: BmcConf, timeout: int = 30):
+        self.bmc = bmc
+        self.timeout = timeout
+        self.proc = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def open(self) -> bool:
+        """Запуск ipmitool shell. Возвращает False, если shell недоступен"""
+        try:
+            self.proc = subprocess.Popen([*self.bmc.ipmi_prefix, 'shell'], stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            self._read_until_prompt(self.timeout)
+            return True
+        except (OSError, RuntimeError) as e:
+            print(f"⚠️  ipmitool shell недоступен, команды IPMI пойдут отдельными процессами: {e}")
+            self._close()
+            return False
+
+    def close(self) -> None:
+        """Завершение shell (exit), при зависании - kill.
+
+        Ждёт команду, выполняемую в другом потоке (не дольше её таймаута).
+        """
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        """Завершение shell без блокировки (вызывается под self._lock или до запуска потоков)"""
+        if self.proc is None:
+            return
+        try:
+            if self.proc.poll() is None:
+                self.proc.stdin.write(b'exit\n')
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+            self.proc.wait()
+        finally:
+            self.proc = None
+
+    def _read_until_prompt(self, timeout: int) -> bytes:
+        """Чтение stdout shell до приглашения ipmitool>"""
+        fd = self.proc.stdout.fileno()
+        buf = bytearray()
+        deadline = time.monotonic() + timeout
+        while not buf.endswith(self.PROMPT):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f'ipmitool shell не ответил за {timeout}s')
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise RuntimeError('ipmitool shell завершился')
+            buf += chunk
+        return bytes(buf[:-len(self.PROMPT)])
+
+    def exec(self, args: List[str], timeout: Optional[int] = None) -> str:
+        """Выполнение команды ipmitool (без префикса -I lanplus ...) в открытой сессии.
+
+        При таймауте или обрыве shell закрывается и выбрасывается RuntimeError.
+        Аргументы объединяются в строку без кавычек - только для ipmi_shell_safe(args).
+        """
+        cmd = ' '.join(args)
+        with self._lock:
+            if not self.alive:
+                raise RuntimeError('ipmitool shell не запущен')
+            try:
+                self.proc.stdin.write(cmd.encode('utf-8') + b'\n')
+                self.proc.stdin.flush()
+                out = self._read_until_prompt(timeout or self.timeout).decode('utf-8', errors='replace')
+            except (OSError, RuntimeError):
+                self._close()
+                raise RuntimeError(f'ipmitool shell: команда "{mask_cmd(args)}" не выполнена')
+        # readline без tty может повторять введённую строку перед ответом
+        if out.startswith(cmd):
+            out = out[len(cmd):].lstrip('\r\n')
+        return out
+
+# Аргументы, которые токенизатор ipmitool shell разобьёт или изменит: пробелы, кавычки, '\'
+_IPMI_SHELL_UNSAFE_RE = re.compile(r'[\s"\'\\]')
+
+def ipmi_shell_safe(args: List[str]) -> bool:
+    """Команду можно передать в ipmitool shell одной строкой без искажения аргументов"""
+    return all(arg and not _IPMI_SHELL_UNSAFE_RE.search(arg) for arg in args)
+
+# Сообщения ipmitool о неудачной команде (в shell нет кода возврата)
+_IPMI_ERR_RE = re.compile(r'^(?:.*\bcommand failed\b|Error\b|Invalid\b|Unable to\b)', re.MULTILINE)
+
+# Таймауты по классу команды ipmitool (первое слово): быстрые команды не ждут
+# зависший BMC по минуте. Неизвестные команды (sensor list, sel elist) - _IPMI_DEFAULT_TIMEOUT
+_IPMI_TIMEOUTS = {'mc': 15, 'user': 15, 'channel': 15, 'fru': 20}
+_IPMI_DEFAULT_TIMEOUT = 60
+# Повтор после истечения короткого таймаута выполняется с этим значением
+_IPMI_RETRY_TIMEOUT = 30
+
+def ipmi_timeout(args: List[str]) -> int:
+    """Таймаут команды ipmitool (без префикса -I lanplus ...) по её классу"""
+    return _IPMI_TIMEOUTS.get(args[0], _IPMI_DEFAULT_TIMEOUT) if args else _IPMI_DEFAULT_TIMEOUT
+
+def run_ipmi(conf: Dict[str, Any],
+             args: List[str],
+             log_file: Path,
+             timeout: Optional[int] = None,
+             accept_rc: Optional[Iterable[int]] = None) -> str:
+    """Команда ipmitool через общую сессию IPMI_SESSION; без сессии - отдельным процессом через run().
+
+    timeout по умолчанию - по классу команды (ipmi_timeout). Если команда
+    в сессии не уложилась, повтор отдельным процессом идёт с таймаутом не
+    меньше _IPMI_RETRY_TIMEOUT.
+    В shell нет кода возврата: сообщение ipmitool об ошибке в выводе сессии
+    считается неудачей (RuntimeError), как ненулевой код у процесса. Если
+    accept_rc допускает ненулевые коды, вывод с ошибкой возвращается как есть.
+    """
+    if accept_rc is not None:
+        accept_rc = list(accept_rc)
+    if timeout is None:
+        timeout = ipmi_timeout(args)
+    # Значения из agent.conf (имя/пароль пользователя) с пробелами или кавычками
+    # передаются отдельным процессом: argv не проходит через токенизатор shell
+    if IPMI_SESSION is not None and IPMI_SESSION.alive and ipmi_shell_safe(args):
+        try:
+            out = IPMI_SESSION.exec(args, timeout=timeout)
+        except RuntimeError as e:
+            print(f"⚠️  {e}, повтор отдельным процессом ipmitool")
+            timeout = max(timeout, _IPMI_RETRY_TIMEOUT)
+        else:
+            cmd_str = mask_cmd(args)
+            with open(log_file, 'a', encoding='utf-8') as f:
+                f.write(f">>> ipmitool shell: {cmd_str}\n")
+                # Эхо команды может остаться в выводе (если не совпало с началом) - пароль маскируется
+                f.write(_MASK_USER_PW.sub(r'\1******', out))
+                f.write('\n')
+            if _IPMI_ERR_RE.search(out) and not (accept_rc and any(rc != 0 for rc in accept_rc)):
+                raise RuntimeError(f"Command ipmitool {cmd_str} failed, see {log_file}")
+            return out.strip()
+    bmc = IPMI_SESSION.bmc if IPMI_SESSION is not None else BmcConf.from_conf(conf)
+    return run([*bmc.ipmi_prefix, *args], log_file, timeout=timeout, accept_rc=accept_rc)
+
+# Ответ BMC "Node busy" (completion code 0xC0) - команду стоит повторить
+_IPMI_BUSY_RE = re.compile(r'node busy|\b0xc0\b', re.IGNORECASE)
+
+def _ipmi_process(cmd: List[str], timeout: int, attempts: int = 3) -> subprocess.CompletedProcess:
+    """Отдельный процесс ipmitool с повтором (пауза со случайным разбросом) при занятости BMC.
+
+    Если истёк короткий таймаут класса команды, выполняется повтор с _IPMI_RETRY_TIMEOUT.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            if attempt == attempts or timeout >= _IPMI_RETRY_TIMEOUT:
+                raise
+            timeout = _IPMI_RETRY_TIMEOUT
+            continue
+        if proc.returncode == 0 or attempt == attempts or \
+                not _IPMI_BUSY_RE.search(proc.stdout.decode('utf-8', errors='replace')):
+            return proc
+        time.sleep(random.uniform(0.2, 0.5) * attempt)
+
+def run_ipmi_batch(conf: Dict[str, Any],
+                   commands: List[List[str]],
+                   log_file: Path,
+                   timeout: Optional[int] = None) -> List[str]:
+    """Группа независимых команд ipmitool, результаты в порядке commands.
+
+    При открытой сессии команды идут подряд через IPMI_SESSION (без установки
+    RMCP+ сессии на каждую). Без сессии процессы ipmitool запускаются
+    параллельно, вывод пишется в лог по порядку после завершения.
+    """
+    if IPMI_SESSION is not None and IPMI_SESSION.alive:
+        return [run_ipmi(conf, args, log_file, timeout=timeout) for args in commands]
+    
+    bmc = IPMI_SESSION.bmc if IPMI_SESSION is not None else BmcConf.from_conf(conf)
+    cmds = [[*bmc.ipmi_prefix, *args] for args in commands]
+    with ThreadPoolExecutor(max_workers=len(cmds) or 1) as ex:
+        futures = [ex.submit(_ipmi_process, cmd, timeout or ipmi_timeout(args))
+                   for cmd, args in zip(cmds, commands)]
+    
+    outputs = []
+    error = None
+    with open(log_file, 'a', encoding='utf-8') as f:
+        for cmd, future in zip(cmds, futures):
+            cmd_str = mask_cmd(cmd)
+            f.write(f">>> {cmd_str}\n")
             try:
-                proc.communicate(timeout=5)  # Даём время для завершения
+                proc = future.result()
             except subprocess.TimeoutExpired:
-                proc.terminate()  # Принудительное завершение
-        raise RuntimeError(f"Command {' '.join(cmd)} timed out after {timeout}s")
-    except FileNotFoundError as e:
-        raise RuntimeError(f"Command not found: {cmd[0]}. Error: {e}")
-    except Exception as e:
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(f"ERROR: {e}\n")
-        raise
+                f.write("ERROR: timeout\n")
+                error = error or RuntimeError(f"Command {cmd_str} timed out")
+                continue
+            except FileNotFoundError as e:
+                f.write(f"ERROR: {e}\n")
+                error = error or RuntimeError(f"Command not found: {cmd[0]}. Error: {e}")
+                continue
+            out = proc.stdout.decode('utf-8', errors='replace')
+            f.write(out + '\n')
+            if proc.returncode != 0:
+                error = error or RuntimeError(f"Command {cmd_str} exit {proc.returncode}, see {log_file}")
+            outputs.append(out.strip())
+    if error is not None:
+        raise error
+    return outputs
+
+# Кэш разобранных JSON: (путь, mtime_ns) -> данные
+_JSON_CACHE: Dict[tuple, Any] = {}
 
 def load_json(path: Path) -> Any:
-    """Загрузка JSON с проверкой существования файла"""
-    if not path.exists():
+    """Загрузка JSON с проверкой существования файла.
+
+    Результат кэшируется по (путь, mtime_ns): повторная загрузка неизменённого
+    файла не читает диск. Возвращается общий объект - вызывающий код не должен
+    его изменять.
+    """
+    try:
+        key = (str(path), path.stat().st_mtime_ns)
+    except FileNotFoundError:
         raise FileNotFoundError(f'Конфигурационный файл не найден: {path}')
+    if key in _JSON_CACHE:
+        return _JSON_CACHE[key]
     try:
-        with path.open('r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError as e:
+        if ORJSON_AVAILABLE:
+            data = orjson.loads(path.read_bytes())
+        else:
+            with path.open('r', encoding='utf-8') as f:
+                data = json.load(f)
+    except json.JSONDecodeError as e:  # orjson.JSONDecodeError - подкласс json.JSONDecodeError
         raise ValueError(f'Ошибка парсинга JSON {path}: {e}')
+    _JSON_CACHE[key] = data
+    return data
+
+def _json_default(obj: Any) -> Any:
+    """Сериализация dataclass-объектов результатов для стандартного json"""
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+def encode_json(data: Any, pretty: bool = False) -> bytes:
+    """JSON в UTF-8 (orjson при наличии, иначе стандартный json).
+
+    По умолчанию компактный вывод без отступов; pretty=True - отступ 2 для чтения глазами
+    (логи шагов и `stage2.py --pretty <report.json>`).
+    """
+    if ORJSON_AVAILABLE:
+        # OPT_NON_STR_KEYS: в результатах есть словари с int ключами (номера i2c шин);
+        # dataclass-объекты orjson сериализует сам
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    if pretty:
+        return json.dumps(data, ensure_ascii=False, indent=2, default=_json_default).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_json_default).encode('utf-8')
+
+def dump_json(data: Any, path: Path, pretty: bool = False) -> None:
+    """Атомарная запись JSON отчёта: временный файл (один write + fsync), затем os.replace.
+
+    При аварийном завершении на месте отчёта остаётся прежний файл, а не обрезанный.
+    """
+    payload = encode_json(data, pretty)
+    tmp_path = path.with_name(path.name + '.tmp')
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # os.write может записать не всё - дописываем остаток
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+def parse_sensor_list(sensor_out: str) -> Dict[str, Dict[str, Any]]:
+    """Разбор вывода `ipmitool sensor list` в словарь {имя: {value, unit, status, reading}}.
+
+    reading - значение, один раз преобразованное в float (None для na/discrete),
+    чтобы анализаторы не повторяли float() с try/except для каждого сенсора.
+    """
+    sensors = {}
+    for line in sensor_out.splitlines():
+        # Нужны только первые 4 колонки из 10: остаток строки не дробим
+        parts = line.split('|', 4)
+        if len(parts) >= 4:
+            name, value, unit, status = map(str.strip, parts[:4])
+            try:
+                reading = float(value)
+            except ValueError:
+                reading = None
+            sensors[name] = {
+                'value': value,
+                'unit': unit,
+                'status': status,
+                'reading': reading
+            }
+    return sensors
+
+# Снимок `sensor list`, общий для шагов до стресс-теста
+_SENSOR_SNAPSHOT: Optional[Dict[str, Dict[str, Any]]] = None
+_SENSOR_SNAPSHOT_TS = 0.0
+_SENSOR_SNAPSHOT_LOCK = threading.Lock()
+
+def get_sensor_snapshot(conf: Dict[str, Any], log_file: Path, max_age: float = 30) -> Dict[str, Dict[str, Any]]:
+    """Общий снимок всех сенсоров BMC (формат parse_sensor_list).
+
+    Команда выполняется при первом вызове (вывод пишется в log_file),
+    дальше в течение max_age секунд возвращается тот же разобранный словарь.
+    Словарь общий для параллельных шагов и SensorValidator - вызывающий код
+    не должен его изменять.
+    Для замеров во времени (baseline/post-stress) используется step_sensors,
+    а не этот снимок.
+    """
+    global _SENSOR_SNAPSHOT, _SENSOR_SNAPSHOT_TS
+    with _SENSOR_SNAPSHOT_LOCK:
+        now = time.monotonic()
+        if _SENSOR_SNAPSHOT is None or now - _SENSOR_SNAPSHOT_TS > max_age:
+            _SENSOR_SNAPSHOT = parse_sensor_list(run_ipmi(conf, ['sensor', 'list'], log_file, timeout=60))
+            _SENSOR_SNAPSHOT_TS = now
+        return _SENSOR_SNAPSHOT
 
 # ---------- step implementations -------------------------------------------
 
@@ -204,7 +705,16 @@ def step_init(conf: Dict[str, Any]) -> None:
 
     # Проверяем, что система в состоянии running
     run(['systemctl', 'is-system-running'], log, accept_rc=[0, 1])  # degraded допускается
-    RESULT_JSON['results']['init'] = {'status': 'PASS'}
+
+    # Общая сессия ipmitool shell открыта в main(); если она оборвалась при чтении FRU
+    # (BMC ещё не принимал RMCP+), переоткрываем до шагов с IPMI, иначе все они
+    # пойдут отдельными процессами с рукопожатием на каждую команду
+    if IPMI_SESSION is not None and not IPMI_SESSION.alive:
+        IPMI_SESSION.open()
+    RESULT_JSON['results']['init'] = {
+        'status': 'PASS',
+        'ipmi_session': IPMI_SESSION is not None and IPMI_SESSION.alive,
+    }
     print_step("Инициализация", "PASS")
 
 def step_bmc_fw(conf, qvl):
@@ -212,9 +722,7 @@ def step_bmc_fw(conf, qvl):
     print_step("Проверка прошивки BMC", "START")
     log = LOG_ROOT / 'bmc_fw.log'
     try:
-        out = run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-                   '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-                   'mc', 'info'], log)
+        out = run_ipmi(conf, ['mc', 'info'], log)
         
         # Улучшенный парсинг версии прошивки
         ver_line = next((l for l in out.splitlines() if 'Firmware Revision' in l), '')
@@ -266,15 +774,11 @@ def step_bios_fw(conf, qvl):
     print_step("Проверка прошивки BIOS", "START")
     log = LOG_ROOT / 'bios_fw.log'
     try:
-        out = run(['dmidecode', '-t', '0'], log, timeout=120)
-        
-        # Улучшенный парсинг версии BIOS
-        ver_line = next((l for l in out.splitlines() if 'Version:' in l), '')
-        if not ver_line:
+        # dmidecode сам выбирает поле BIOS Version из SMBIOS type 0 - без разбора всего блока
+        current = run(['dmidecode', '-s', 'bios-version'], log, timeout=120).strip()
+        if not current:
             current = 'unknown'
-            print("Предупреждение: Не найдена строка 'Version:' в выводе dmidecode")
-        else:
-            current = ver_line.split(':', 1)[1].strip() if ':' in ver_line else 'unknown'
+            print("Предупреждение: dmidecode не вернул версию BIOS")
         
         print(f"Текущая версия BIOS: {current}")
         
@@ -309,6 +813,13 @@ def step_bios_fw(conf, qvl):
         }
         print_step("Проверка прошивки BIOS", "ERROR")
 
+_DIMM_SIZE_RE = re.compile(r'(\d+)\s*GB')
+# Поля dmidecode -t 17, которые используются при анализе DIMM
+_DIMM_FIELDS = frozenset({
+    'Size', 'Type', 'Speed', 'Configured Memory Speed', 'Manufacturer',
+    'Part Number', 'Serial Number', 'Locator', 'Bank Locator',
+})
+
 def check_memory_configuration(dimm_data: List[Dict]) -> Dict:
     """Детальная проверка конфигурации памяти по банкам"""
     results = {
@@ -330,16 +841,10 @@ def check_memory_configuration(dimm_data: List[Dict]) -> Dict:
             results['slot_details'][slot_name] = {'status': 'empty'}
         else:
             results['populated_slots'] += 1
-            # Парсим размер памяти
-            if 'GB' in size:
-                try:
-                    memory_gb = int(size.split()[0])
-                    results['total_memory_gb'] += memory_gb
-                except (ValueError, IndexError) as e:
-                    memory_gb = 0
-                    print(f"⚠️  Ошибка парсинга размера памяти '{size}': {e}")
-            else:
-                memory_gb = 0
+            # Парсим размер памяти ("16 GB")
+            m = _DIMM_SIZE_RE.match(size)
+            memory_gb = int(m.group(1)) if m else 0
+            results['total_memory_gb'] += memory_gb
                 
             results['slot_details'][slot_name] = {
                 'status': 'populated',
@@ -400,8 +905,65 @@ def check_memory_configuration(dimm_data: List[Dict]) -> Dict:
     
     return results
 
-def validate_pci_slots(lshw_data, sensor_data: Dict) -> Dict:
-    """Проверка заполненности и температуры PCIe слотов"""
+def index_sensors(sensor_data: Dict) -> Dict[str, Dict]:
+    """Один проход по сенсорам с группировкой для потребителей:
+    'slot_temp' - SLOT*TEMP (validate_pci_slots), 'vrm_temp' - VR_*TEMP (анализ VRM)
+    """
+    groups = defaultdict(dict)
+    for name, info in sensor_data.items():
+        if 'TEMP' not in name:
+            continue
+        if name.startswith('SLOT'):
+            groups['slot_temp'][name] = info
+        if 'VR_' in name:
+            groups['vrm_temp'][name] = info
+    return groups
+
+def walk_lshw(data: Any, visitors: Iterable) -> None:
+    """Однократный обход дерева lshw: каждый visitor вызывается для каждого узла.
+
+    Обход итеративный (явный стек вместо рекурсии), порядок узлов - прямой,
+    как у прежних рекурсивных поисков.
+    """
+    visitors = tuple(visitors)
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for visit in visitors:
+                visit(node)
+            children = node.get('children')
+            if children:
+                stack.extend(reversed(children))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+def lshw_pci_entry(node: Dict) -> Optional[Dict]:
+    """Описание PCIe устройства для узла lshw (None, если узел не PCI)"""
+    businfo = node.get('businfo')
+    if not businfo or not businfo.startswith('pci@'):
+        return None
+    description = node.get('description')
+    if description is None:
+        return None
+    return {
+        'bdf': f"{businfo[4:]} {description}",
+        'description': description,
+        'class': description,
+        'width': node.get('width', 'unknown'),
+        'speed': node.get('speed', 'unknown')
+    }
+
+# Встроенные PCI устройства, которые не считаются картами расширения
+# ('host bridge' покрывается 'bridge')
+_PCI_BUILTIN_KW = ('ethernet', 'vga', 'usb', 'sata', 'audio', 'bridge')
+
+def validate_pci_slots(pci_devices: List[Dict], slot_temp_sensors: Dict) -> Dict:
+    """Проверка заполненности и температуры PCIe слотов.
+
+    pci_devices - PCIe устройства из lshw (собранные walk_lshw),
+    slot_temp_sensors - группа 'slot_temp' из index_sensors().
+    """
     results = {
         'total_slots': 0,
         'populated_slots': 0,
@@ -411,9 +973,6 @@ def validate_pci_slots(lshw_data, sensor_data: Dict) -> Dict:
     }
     
     # Анализ температурных сенсоров слотов
-    slot_temp_sensors = {k: v for k, v in sensor_data.items() 
-                        if k.startswith('SLOT') and 'TEMP' in k}
-    
     for sensor_name, sensor_info in slot_temp_sensors.items():
         slot_num = sensor_name.replace('SLOT', '').replace('_TEMP', '')
         results['total_slots'] += 1
@@ -422,8 +981,8 @@ def validate_pci_slots(lshw_data, sensor_data: Dict) -> Dict:
         temp_status = sensor_info.get('status', 'na')
         
         if temp_value != 'na' and temp_status == 'ok':
-            try:
-                temp_c = float(temp_value)
+            temp_c = sensor_info.get('reading')
+            if temp_c is not None:
                 # Слот считается активным только если температура значительно выше ambient
                 # Обычно ambient ~27-30°C, активные карты >40°C
                 if temp_c > 40.0:  # Порог для определения активности
@@ -446,7 +1005,7 @@ def validate_pci_slots(lshw_data, sensor_data: Dict) -> Dict:
                 if temp_c > 90:
                     results['warnings'].append(f'Slot {slot_num} overheating: {temp_c}°C')
                     
-            except ValueError:
+            else:
                 results['slot_temperatures'][slot_num] = {
                     'temperature_c': None,
                     'status': 'sensor_error',
@@ -459,18 +1018,16 @@ def validate_pci_slots(lshw_data, sensor_data: Dict) -> Dict:
                 'sensor_status': temp_status
             }
     
-    # Улучшенный анализ PCI устройств из lshw (теперь принимает разобранные данные)
-    pci_devices = find_pci_devices(lshw_data)
+    # Улучшенный анализ PCI устройств из lshw
     results['pci_devices_detected'] = len(pci_devices)
     
     # Более точное сравнение - учитываем что не все PCI устройства имеют температурные датчики
     # Встроенные устройства (сеть, VGA, USB контроллеры) обычно не имеют датчиков в слотах
     expansion_cards = []
     for device in pci_devices:
-        description = device.get('description', '').lower()
+        description = device.get('description', '').casefold()
         # Исключаем встроенные устройства
-        if not any(builtin in description for builtin in 
-                  ['ethernet', 'vga', 'usb', 'sata', 'audio', 'bridge', 'host bridge']):
+        if not any(builtin in description for builtin in _PCI_BUILTIN_KW):
             expansion_cards.append(device)
     
     results['expansion_cards_detected'] = len(expansion_cards)
@@ -481,6 +1038,74 @@ def validate_pci_slots(lshw_data, sensor_data: Dict) -> Dict:
     
     return results
 
+# Подсказки enhanced_i2c_scan по адресу i2c устройства (индекс - адрес)
+_I2C_SCAN_HINTS: List[Optional[str]] = [None] * 256
+for _a in range(0x48, 0x50):
+    _I2C_SCAN_HINTS[_a] = 'CPLD'
+for _a in range(0x60, 0x70):
+    _I2C_SCAN_HINTS[_a] = 'VRM'
+for _a in range(0x50, 0x54):
+    _I2C_SCAN_HINTS[_a] = 'EEPROM'
+
+# Классификация analyze_i2c_devices: адрес -> код, код -> (type, список в анализе)
+_I2C_CLASS_INFO = (
+    ('unknown', 'unknown_devices'),
+    ('potential_cpld', 'potential_cpld'),
+    ('potential_vrm_or_sensor', 'potential_vrm'),
+    ('potential_eeprom', 'potential_eeprom'),
+    ('potential_vrm', 'potential_vrm'),
+)
+_I2C_CLASS = bytearray(256)
+for _lo, _hi, _code in ((0x08, 0x0F, 1), (0x40, 0x4F, 2), (0x50, 0x57, 3), (0x60, 0x6F, 4)):
+    _I2C_CLASS[_lo:_hi + 1] = bytes([_code]) * (_hi - _lo + 1)
+
+def _probe_i2c_bus_smbus2(bus_num: int) -> List[str]:
+    """Поиск устройств на шине через smbus2 с теми же пробами, что i2cdetect -y
+    (адреса 0x08-0x77): read byte для 0x30-0x37 и 0x50-0x5F (EEPROM), quick write для остальных.
+    Адреса, занятые драйвером (EBUSY, 'UU' у i2cdetect), пропускаются.
+    """
+    devices = []
+    with smbus2.SMBus(bus_num) as bus:
+        has_quick = bool(bus.funcs & smbus2.I2cFunc.SMBUS_QUICK)
+        # Диапазон i2cdetect по умолчанию: зарезервированные 0x03-0x07 не опрашиваются
+        for addr in range(0x08, 0x78):
+            try:
+                if not has_quick or 0x30 <= addr <= 0x37 or 0x50 <= addr <= 0x5F:
+                    bus.read_byte(addr)
+                else:
+                    bus.write_quick(addr)
+            except OSError:
+                continue
+            devices.append(f'{addr:02x}')
+    return devices
+
+def scan_i2c_bus(bus_num: int) -> Optional[List[str]]:
+    """Адреса устройств на шине i2c (hex строки) или None, если шина недоступна.
+
+    При наличии smbus2 шина опрашивается напрямую через /dev/i2c-N,
+    иначе запускается i2cdetect -y.
+    """
+    if SMBUS2_AVAILABLE:
+        try:
+            return _probe_i2c_bus_smbus2(bus_num)
+        except OSError:
+            return None
+    
+    result = subprocess.run(['i2cdetect', '-y', str(bus_num)],
+                            capture_output=True, text=True, timeout=15)  # Увеличен timeout до 15 сек
+    if result.returncode != 0 or 'Error:' in result.stdout:
+        return None
+    
+    devices = []
+    lines = result.stdout.strip().split('\n')[1:]  # Пропускаем заголовок
+    for line in lines:
+        parts = line.split()
+        if len(parts) > 1:
+            for addr in parts[1:]:
+                if addr != '--' and addr != 'UU':
+                    devices.append(addr)
+    return devices
+
 def enhanced_i2c_scan() -> Dict:
     """Улучшенное сканирование i2c шин с обработкой недоступных шин"""
     results = {
@@ -492,44 +1117,39 @@ def enhanced_i2c_scan() -> Dict:
     }
     
     # Сначала определяем доступные шины через /dev
-    dev_i2c_buses = glob.glob('/dev/i2c-*')
-    potential_buses = [int(b.split('-')[1]) for b in dev_i2c_buses if b.split('-')[1].isdigit()]
+    try:
+        with os.scandir('/dev') as it:
+            potential_buses = sorted(int(e.name[4:]) for e in it
+                                     if e.name.startswith('i2c-') and e.name[4:].isdigit())
+    except OSError:
+        potential_buses = []
     
     if not potential_buses:
         # Fallback - пробуем стандартный диапазон
         potential_buses = list(range(11))  # 0-10 как в логах
     
-    for bus_num in potential_buses:
+    # Шины независимы - опрашиваем их параллельно, результаты разбираем в порядке номеров
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        scans = [(bus_num, ex.submit(scan_i2c_bus, bus_num)) for bus_num in potential_buses]
+    if SMBUS2_AVAILABLE:
+        results['scan_method'] = 'enhanced_smbus2'
+    
+    for bus_num, scan in scans:
         try:
             # Проверяем доступность шины
-            result = subprocess.run(['i2cdetect', '-y', str(bus_num)], 
-                                  capture_output=True, text=True, timeout=15)  # Увеличен timeout до 15 сек
+            devices = scan.result()
             
-            if result.returncode == 0 and 'Error:' not in result.stdout:
+            if devices is not None:
                 results['available_buses'].append(bus_num)
                 
-                # Ищем устройства на шине
-                devices = []
-                lines = result.stdout.strip().split('\n')[1:]  # Пропускаем заголовок
-                for line in lines:
-                    parts = line.split()
-                    if len(parts) > 1:
-                        for addr in parts[1:]:
-                            if addr != '--' and addr != 'UU':
-                                devices.append(addr)
-                
                 if devices:
                     results['detected_devices'][bus_num] = devices
                     
                     # Классификация устройств по адресам
                     for addr in devices:
-                        addr_int = int(addr, 16)
-                        if 0x48 <= addr_int <= 0x4F:
-                            results['warnings'].append(f'Bus {bus_num}: Possible CPLD at 0x{addr}')
-                        elif 0x60 <= addr_int <= 0x6F:
-                            results['warnings'].append(f'Bus {bus_num}: Possible VRM at 0x{addr}')
-                        elif addr_int in [0x50, 0x51, 0x52, 0x53]:
-                            results['warnings'].append(f'Bus {bus_num}: Possible EEPROM at 0x{addr}')
+                        hint = _I2C_SCAN_HINTS[int(addr, 16)]
+                        if hint:
+                            results['warnings'].append(f'Bus {bus_num}: Possible {hint} at 0x{addr}')
                             
             else:
                 results['unavailable_buses'].append(bus_num)
@@ -555,8 +1175,14 @@ def enhanced_i2c_scan() -> Dict:
     
     return results
 
-def analyze_vrm_temperatures(sensor_data: Dict) -> Dict:
-    """Расширенный анализ температур VRM регуляторов"""
+# Категории VRM в имени сенсора: VCCIN, VCCFA, FAON, D_HV
+_VRM_CATEGORY_RE = re.compile(r'(VCCIN|VCCFA|FAON|D_HV)')
+
+def analyze_vrm_temperatures(vrm_sensors: Dict) -> Dict:
+    """Расширенный анализ температур VRM регуляторов.
+
+    vrm_sensors - группа 'vrm_temp' из index_sensors().
+    """
     results = {
         'vrm_sensors': {},
         'thermal_zones': {},
@@ -564,10 +1190,6 @@ def analyze_vrm_temperatures(sensor_data: Dict) -> Dict:
         'status': 'PASS'
     }
     
-    # Поиск VRM температурных сенсоров
-    vrm_sensors = {k: v for k, v in sensor_data.items() 
-                  if 'VR_' in k and 'TEMP' in k}
-    
     vrm_categories = {
         'VCCIN': [],  # Процессорное питание
         'VCCFA': [],  # Fabric питание  
@@ -580,18 +1202,17 @@ def analyze_vrm_temperatures(sensor_data: Dict) -> Dict:
         temp_status = sensor_info.get('status', 'na')
         
         if temp_value != 'na' and temp_status == 'ok':
-            try:
-                temp_c = float(temp_value)
+            temp_c = sensor_info.get('reading')
+            if temp_c is not None:
                 
                 # Классификация по типу VRM
-                for category in vrm_categories:
-                    if category in sensor_name:
-                        vrm_categories[category].append({
-                            'sensor': sensor_name,
-                            'temperature': temp_c,
-                            'status': temp_status
-                        })
-                        break
+                m = _VRM_CATEGORY_RE.search(sensor_name)
+                if m:
+                    vrm_categories[m.group(1)].append({
+                        'sensor': sensor_name,
+                        'temperature': temp_c,
+                        'status': temp_status
+                    })
                 
                 results['vrm_sensors'][sensor_name] = {
                     'temperature_c': temp_c,
@@ -609,23 +1230,32 @@ def analyze_vrm_temperatures(sensor_data: Dict) -> Dict:
                     if results['status'] == 'PASS':
                         results['status'] = 'WARNING'
                         
-            except ValueError:
+            else:
                 results['warnings'].append(f'{sensor_name}: Invalid temperature value {temp_value}')
     
     # Анализ температурных зон
     for category, sensors in vrm_categories.items():
         if sensors:
-            temps = [s['temperature'] for s in sensors]
+            # Сумма, максимум и минимум за один проход
+            total = 0.0
+            t_max = t_min = sensors[0]['temperature']
+            for s in sensors:
+                t = s['temperature']
+                total += t
+                if t > t_max:
+                    t_max = t
+                elif t < t_min:
+                    t_min = t
             results['thermal_zones'][category] = {
                 'sensor_count': len(sensors),
-                'avg_temperature': sum(temps) / len(temps),
-                'max_temperature': max(temps),
-                'min_temperature': min(temps),
+                'avg_temperature': total / len(sensors),
+                'max_temperature': t_max,
+                'min_temperature': t_min,
                 'sensors': sensors
             }
             
             # Проверка разброса температур
-            temp_range = max(temps) - min(temps)
+            temp_range = t_max - t_min
             if temp_range > 10.0:
                 results['warnings'].append(
                     f'{category} VRM: Large temperature spread {temp_range:.1f}°C'
@@ -633,6 +1263,16 @@ def analyze_vrm_temperatures(sensor_data: Dict) -> Dict:
     
     return results
 
+# Ключевые слова FPGA/CPLD в выводе lspci -v
+_FPGA_RE = re.compile(r'FPGA|ALTERA|XILINX|LATTICE|CPLD', re.IGNORECASE)
+# Ключевые слова CPLD в dmesg и классы контроллеров в lspci
+# (строки целиком: фильтрация и разбиение на строки - одним проходом по буферу)
+_CPLD_LINE_RE = re.compile(r'^.*(?:CPLD|LATTICE|ALTERA).*$', re.IGNORECASE | re.MULTILINE)
+_ASPEED_RE = re.compile(r'ASPEED', re.IGNORECASE)
+_CTRL_RE = re.compile(r'MANAGEMENT|CONTROLLER|BRIDGE', re.IGNORECASE)
+_INTEL_RE = re.compile(r'INTEL', re.IGNORECASE)
+_ETH_RE = re.compile(r'ETHERNET', re.IGNORECASE)
+
 def step_cpld_fpga_vrm_check(conf, qvl):
     """Шаг 2.1. Улучшенная проверка версий CPLD/FPGA/VRM"""
     print_step("Проверка CPLD/FPGA/VRM", "START")
@@ -640,31 +1280,35 @@ def step_cpld_fpga_vrm_check(conf, qvl):
     results = {}
     
     try:
-        # 1. Улучшенное сканирование i2c
-        i2c_results = enhanced_i2c_scan()
-        results['i2c_scan'] = i2c_results
-        
-        # 2. Детальный анализ i2c устройств
-        i2c_device_analysis = analyze_i2c_devices(i2c_results)
-        results['i2c_device_analysis'] = i2c_device_analysis
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            # IPMI-запрос к BMC и поиск CPLD выполняются параллельно со сканированием i2c
+            vrm_future = ex.submit(analyze_vrm_via_ipmi, conf, log)
+            cpld_future = ex.submit(detect_cpld_devices, log)
+            
+            # 1. Улучшенное сканирование i2c
+            i2c_results = enhanced_i2c_scan()
+            results['i2c_scan'] = i2c_results
+            
+            # 2. Детальный анализ i2c устройств
+            i2c_device_analysis = analyze_i2c_devices(i2c_results)
+            results['i2c_device_analysis'] = i2c_device_analysis
+            
+            # 4. VRM анализ через IPMI сенсоры
+            vrm_analysis = vrm_future.result()
+            results['vrm_analysis'] = vrm_analysis
+            
+            # 5. Поиск CPLD через специфичные методы
+            cpld_analysis = cpld_future.result()
+            results['cpld_analysis'] = cpld_analysis
         
-        # 3. FPGA проверка через lspci
+        # 3. FPGA проверка через lspci (после VRM: run() нельзя писать в один лог параллельно)
         out = run(['lspci', '-v'], log)
-        fpga_devices = [l for l in out.splitlines() if any(keyword in l.upper() 
-                       for keyword in ['FPGA', 'ALTERA', 'XILINX', 'LATTICE', 'CPLD'])]
+        fpga_devices = [l for l in out.splitlines() if _FPGA_RE.search(l)]
         results['fpga_devices'] = {
             'count': len(fpga_devices),
             'devices': fpga_devices
         }
         
-        # 4. VRM анализ через IPMI сенсоры
-        vrm_analysis = analyze_vrm_via_ipmi(conf, log)
-        results['vrm_analysis'] = vrm_analysis
-        
-        # 5. Поиск CPLD через специфичные методы
-        cpld_analysis = detect_cpld_devices(log)
-        results['cpld_analysis'] = cpld_analysis
-        
         # 6. Анализ системных контроллеров
         system_controllers = analyze_system_controllers(out)
         results['system_controllers'] = system_controllers
@@ -696,6 +1340,21 @@ def step_cpld_fpga_vrm_check(conf, qvl):
         }
         print_step("Проверка CPLD/FPGA/VRM", "ERROR")
 
+# Строка i2cdump без данных: после адреса строки ("00:") только XX, пробелы и '-'
+_I2C_EMPTY_RE = re.compile(r'[X :-]*')
+
+def dump_i2c_device(bus_num, addr_str: str) -> Optional[List[str]]:
+    """i2cdump одного устройства. Возвращает первые 3 строки данных или None, если данных нет"""
+    result = subprocess.run(['i2cdump', '-y', str(bus_num), addr_str], 
+                          capture_output=True, text=True, timeout=5)
+    if result.returncode != 0:
+        return None
+    # Проверяем, что есть реальные данные (не только XX)
+    lines = result.stdout.split('\n')[1:4]  # Первые 3 строки данных
+    if any(line and not _I2C_EMPTY_RE.fullmatch(line, line.find(':') + 1) for line in lines):
+        return lines
+    return None
+
 def analyze_i2c_devices(i2c_results: Dict) -> Dict:
     """Детальный анализ найденных i2c устройств"""
     analysis = {
@@ -707,62 +1366,63 @@ def analyze_i2c_devices(i2c_results: Dict) -> Dict:
         'unknown_devices': []
     }
     
+    targets = []
     for bus_num, devices in i2c_results.get('detected_devices', {}).items():
         for addr_str in devices:
             try:
                 addr_int = int(addr_str, 16)
-                device_info = {
-                    'bus': bus_num,
-                    'address': addr_str,
-                    'address_int': addr_int
-                }
-                
-                # Классификация по адресу
-                if 0x08 <= addr_int <= 0x0F:
-                    device_info['type'] = 'potential_cpld'
-                    analysis['potential_cpld'].append(device_info)
-                elif 0x40 <= addr_int <= 0x4F:
-                    device_info['type'] = 'potential_vrm_or_sensor'
-                    analysis['potential_vrm'].append(device_info)
-                elif 0x50 <= addr_int <= 0x57:
-                    device_info['type'] = 'potential_eeprom'
-                    analysis['potential_eeprom'].append(device_info)
-                elif 0x60 <= addr_int <= 0x6F:
-                    device_info['type'] = 'potential_vrm'
-                    analysis['potential_vrm'].append(device_info)
-                else:
-                    device_info['type'] = 'unknown'
-                    analysis['unknown_devices'].append(device_info)
-                
-                # Попытка чтения данных
-                try:
-                    result = subprocess.run(['i2cdump', '-y', str(bus_num), addr_str], 
-                                          capture_output=True, text=True, timeout=5)
-                    if result.returncode == 0:
-                        # Проверяем, что есть реальные данные (не только XX)
-                        lines = result.stdout.split('\n')[1:4]  # Первые 3 строки данных
-                        has_real_data = any(line for line in lines 
-                                          if line and not all(c in 'X -:' for c in line.replace(' ', '')))
-                        
-                        if has_real_data:
-                            device_info['readable'] = True
-                            device_info['sample_data'] = lines
-                            analysis['readable_devices'][f"{bus_num}:{addr_str}"] = device_info
-                        else:
-                            device_info['readable'] = False
-                    else:
-                        device_info['readable'] = False
-                except Exception as e:
-                    device_info['readable'] = False
-                    print(f"⚠️  Ошибка при проверке i2c устройства {bus_num}:{addr_str}: {e}")
-                    
-                analysis['device_classification'][f"{bus_num}:{addr_str}"] = device_info
-                
             except ValueError:
                 continue
+            device_info = {
+                'bus': bus_num,
+                'address': addr_str,
+                'address_int': addr_int
+            }
+            
+            # Классификация по адресу
+            device_type, bucket = _I2C_CLASS_INFO[_I2C_CLASS[addr_int]]
+            device_info['type'] = device_type
+            analysis[bucket].append(device_info)
+            targets.append(device_info)
+    
+    if not targets:
+        return analysis
+    
+    # Попытка чтения данных: i2cdump ограничен задержками шины, опрашиваем параллельно
+    with ThreadPoolExecutor(max_workers=min(16, len(targets))) as ex:
+        dumps = [ex.submit(dump_i2c_device, info['bus'], info['address']) for info in targets]
+    
+    for device_info, dump in zip(targets, dumps):
+        key = f"{device_info['bus']}:{device_info['address']}"
+        try:
+            lines = dump.result()
+        except Exception as e:
+            lines = None
+            print(f"⚠️  Ошибка при проверке i2c устройства {key}: {e}")
+        
+        if lines is not None:
+            device_info['readable'] = True
+            device_info['sample_data'] = lines
+            analysis['readable_devices'][key] = device_info
+        else:
+            device_info['readable'] = False
+        analysis['device_classification'][key] = device_info
     
     return analysis
 
+@dataclass
+class VRMReading:
+    """Показание VRM сенсора; в отчёт сериализуется как словарь (см. dump_json)"""
+    __slots__ = ('temperature', 'unit', 'status', 'bus_line')
+    temperature: float
+    unit: str
+    status: str
+    bus_line: str
+
+# Пороги температуры VRM по IPMI сенсорам, °C
+VRM_TEMP_WARN_C = 100.0
+VRM_TEMP_FAIL_C = 115.0
+
 def analyze_vrm_via_ipmi(conf: Dict, log: Path) -> Dict:
     """Анализ VRM через IPMI сенсоры"""
     analysis = {
@@ -773,43 +1433,41 @@ def analyze_vrm_via_ipmi(conf: Dict, log: Path) -> Dict:
     }
     
     try:
-        sensor_out = run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-                         '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-                         'sensor', 'list'], log, timeout=60)
+        sensors = get_sensor_snapshot(conf, log)
         
         # Поиск VRM сенсоров
-        for line in sensor_out.splitlines():
-            if 'VR_' in line and 'TEMP' in line:
-                parts = line.split('|')
-                if len(parts) >= 4:
-                    name = parts[0].strip()
-                    value = parts[1].strip()
-                    unit = parts[2].strip()
-                    status = parts[3].strip()
+        peak = None
+        for name, sensor_info in index_sensors(sensors)['vrm_temp'].items():
+            value = sensor_info['value']
+            unit = sensor_info['unit']
+            status = sensor_info['status']
+            
+            if value != 'na' and status == 'ok':
+                temp_c = sensor_info['reading']
+                if temp_c is not None:
+                    analysis['vrm_sensors'][name] = VRMReading(
+                        temp_c, unit, status, f'{name} | {value} | {unit} | {status}'
+                    )
+                    analysis['sensor_count'] += 1
+                    if peak is None or temp_c > peak:
+                        peak = temp_c
                     
-                    if value != 'na' and status == 'ok':
-                        try:
-                            temp_c = float(value)
-                            analysis['vrm_sensors'][name] = {
-                                'temperature': temp_c,
-                                'unit': unit,
-                                'status': status,
-                                'bus_line': line.strip()
-                            }
-                            analysis['sensor_count'] += 1
-                            
-                            # Проверка температурных порогов
-                            if temp_c >= 100.0:
-                                analysis['warnings'].append(f'{name}: High temperature {temp_c}°C')
-                                if analysis['temperature_status'] == 'PASS':
-                                    analysis['temperature_status'] = 'WARNING'
-                            if temp_c >= 115.0:
-                                analysis['warnings'].append(f'{name}: Critical temperature {temp_c}°C')
-                                analysis['temperature_status'] = 'FAIL'
-                                
-                        except ValueError:
-                            analysis['warnings'].append(f'{name}: Invalid temperature value {value}')
-    
+                    # Строки предупреждений только для горячих сенсоров
+                    if temp_c >= VRM_TEMP_WARN_C:
+                        analysis['warnings'].append(f'{name}: High temperature {temp_c}°C')
+                        if temp_c >= VRM_TEMP_FAIL_C:
+                            analysis['warnings'].append(f'{name}: Critical temperature {temp_c}°C')
+                        
+                else:
+                    analysis['warnings'].append(f'{name}: Invalid temperature value {value}')
+        
+        # Статус определяется один раз по максимальной температуре
+        if peak is not None:
+            if peak >= VRM_TEMP_FAIL_C:
+                analysis['temperature_status'] = 'FAIL'
+            elif peak >= VRM_TEMP_WARN_C:
+                analysis['temperature_status'] = 'WARNING'
+
     except Exception as e:
         analysis['error'] = str(e)
         analysis['temperature_status'] = 'ERROR'
@@ -828,25 +1486,40 @@ def detect_cpld_devices(log: Path) -> Dict:
         # Метод 1: Поиск через dmesg
         dmesg_result = subprocess.run(['dmesg'], capture_output=True, text=True, timeout=10)
         if dmesg_result.returncode == 0:
-            cpld_lines = [line for line in dmesg_result.stdout.splitlines() 
-                         if any(keyword in line.lower() for keyword in ['cpld', 'lattice', 'altera'])]
+            # Нужны только первые 3 строки - дальше dmesg не сканируется
+            cpld_lines = [m.group() for m in itertools.islice(_CPLD_LINE_RE.finditer(dmesg_result.stdout), 3)]
             if cpld_lines:
-                analysis['potential_cpld_devices'].extend(cpld_lines[:3])  # Первые 3 строки
+                analysis['potential_cpld_devices'].extend(cpld_lines)
                 analysis['detection_methods'].append('dmesg_scan')
         
-        # Метод 2: Поиск через /sys/bus
+        # Метод 2: Поиск через /sys/bus (один проход по devices/ каждой шины)
         sys_devices = []
-        for pattern in ['/sys/bus/*/devices/*cpld*', '/sys/bus/*/devices/*lattice*']:
-            sys_devices.extend(glob.glob(pattern))
+        try:
+            with os.scandir('/sys/bus') as buses:
+                for bus in buses:
+                    try:
+                        with os.scandir(os.path.join(bus.path, 'devices')) as it:
+                            for entry in it:
+                                low = entry.name.casefold()
+                                if 'cpld' in low or 'lattice' in low:
+                                    sys_devices.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
         
         if sys_devices:
-            analysis['potential_cpld_devices'].extend([Path(d).name for d in sys_devices])
+            analysis['potential_cpld_devices'].extend(sys_devices)
             analysis['detection_methods'].append('sysfs_scan')
         
         # Метод 3: Поиск через /proc/device-tree (если есть)
-        dt_cpld = glob.glob('/proc/device-tree/*cpld*')
+        try:
+            with os.scandir('/proc/device-tree') as it:
+                dt_cpld = [entry.name for entry in it if 'cpld' in entry.name]
+        except OSError:
+            dt_cpld = []
         if dt_cpld:
-            analysis['potential_cpld_devices'].extend([Path(d).name for d in dt_cpld])
+            analysis['potential_cpld_devices'].extend(dt_cpld)
             analysis['detection_methods'].append('device_tree_scan')
         
         # Определение статуса
@@ -873,22 +1546,22 @@ def analyze_system_controllers(lspci_output: str) -> Dict:
     }
     
     for line in lspci_output.splitlines():
-        line_upper = line.upper()
-        
         # ASPEED контроллеры (часто содержат CPLD)
-        if 'ASPEED' in line_upper:
+        if _ASPEED_RE.search(line):
             analysis['aspeed_controllers'].append(line.strip())
             analysis['total_controllers'] += 1
+            continue
+        
+        if not _CTRL_RE.search(line):
+            continue
         
         # Intel контроллеры управления
-        elif 'INTEL' in line_upper and any(keyword in line_upper for keyword in 
-                                          ['MANAGEMENT', 'CONTROLLER', 'BRIDGE']):
+        if _INTEL_RE.search(line):
             analysis['intel_controllers'].append(line.strip())
             analysis['total_controllers'] += 1
         
         # Другие потенциальные контроллеры
-        elif any(keyword in line_upper for keyword in 
-                ['CONTROLLER', 'BRIDGE', 'MANAGEMENT']) and 'ETHERNET' not in line_upper:
+        elif not _ETH_RE.search(line):
             analysis['other_controllers'].append(line.strip())
             analysis['total_controllers'] += 1
     
@@ -930,10 +1603,9 @@ def determine_cpld_fpga_vrm_status(results: Dict) -> str:
         status_factors.append(('controllers', 'WARNING'))
     
     # Логика определения итогового статуса
-    fail_count = sum(1 for _, status in status_factors if status == 'FAIL')
-    error_count = sum(1 for _, status in status_factors if status == 'ERROR')
-    warning_count = sum(1 for _, status in status_factors if status == 'WARNING')
-    pass_count = sum(1 for _, status in status_factors if status == 'PASS')
+    counts = Counter(status for _, status in status_factors)
+    fail_count, error_count = counts['FAIL'], counts['ERROR']
+    warning_count, pass_count = counts['WARNING'], counts['PASS']
     
     if error_count > 0:
         return 'ERROR'
@@ -948,6 +1620,40 @@ def determine_cpld_fpga_vrm_status(results: Dict) -> str:
     else:
         return 'FAIL'
 
+def probe_sata(device: str) -> tuple:
+    """hdparm -I для одного диска. Возвращает (модель или None, вывод hdparm)"""
+    result = subprocess.run(['hdparm', '-I', device], capture_output=True, text=True, timeout=30)
+    if result.returncode not in (0, 1):
+        raise RuntimeError(f"hdparm -I {device} exit {result.returncode}: {result.stderr.strip()}")
+    model = None
+    idx = result.stdout.find('Model Number:')
+    if idx != -1:
+        end = result.stdout.find('\n', idx)
+        model = result.stdout[idx + len('Model Number:'):end if end != -1 else None].strip()
+    return model, result.stdout + result.stderr
+
+def capture_lshw(json_file: Path, log_file: Path) -> Any:
+    """lshw -json: stdout пишется напрямую в json_file и разбирается один раз.
+
+    Вывод не держится в памяти строкой и не сериализуется повторно;
+    stderr и код возврата пишутся в log_file.
+    """
+    with json_file.open('wb') as out:
+        try:
+            result = subprocess.run(['lshw', '-json'], stdout=out, stderr=subprocess.PIPE, timeout=300)
+        except subprocess.TimeoutExpired:
+            raise RuntimeError("Command lshw -json timeout after 300s")
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(f">>> lshw -json > {json_file} (rc={result.returncode})\n")
+        f.write(result.stderr.decode(errors='replace'))
+    if result.returncode != 0:
+        raise RuntimeError(f"Command lshw -json exit {result.returncode}")
+    try:
+        data = json_file.read_bytes()
+        return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+    except json.JSONDecodeError as e:
+        raise RuntimeError(f"Ошибка парсинга JSON от lshw: {e}")
+
 def step_detailed_inventory(conf, reference):
     """4.2.6 Детальная инвентаризация через lshw"""
     log = LOG_ROOT / 'detailed_inventory.log'
@@ -955,67 +1661,76 @@ def step_detailed_inventory(conf, reference):
     print_step("Детальная инвентаризация")
     
     try:
-        # Получаем детальную информацию об аппаратуре
-        lshw_result = run(['lshw', '-json'], log)
-        
-        # Парсим JSON данные напрямую из stdout, избегая проблем с логом
-        try:
-            cur = json.loads(lshw_result)
-        except json.JSONDecodeError as e:
-            raise RuntimeError(f"Ошибка парсинга JSON от lshw: {e}")
-        
-        # Сохраняем полные данные lshw в отдельный файл
-        lshw_json_file = LOG_ROOT / 'lshw.json'
-        with lshw_json_file.open('w', encoding='utf-8') as f:
-            json.dump(cur, f, ensure_ascii=False, indent=2)
+        # lshw опрашивает шины несколько секунд - запускаем его в фоне (со своим логом,
+        # т.к. run() не допускает параллельной записи в один лог) и пока читаем
+        # SMBIOS и USB в основном потоке
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            lshw_json_file = LOG_ROOT / 'lshw.json'
+            lshw_future = ex.submit(capture_lshw, lshw_json_file, LOG_ROOT / 'lshw.log')
+            dimm_out = run(['dmidecode', '-t', '17'], log)
+            usb_out = run(['lsusb'], log, accept_rc=[0, 1])
+            cur = lshw_future.result()
         
         results = {}
         
-        # 4.2.6.1 Анализ процессоров
-        def find_processors(data):
-            """Рекурсивно ищет процессоры в данных lshw"""
-            processors = []
-            
-            def search_node(node):
-                if isinstance(node, dict):
-                    # Ищем узлы с классом 'processor'
-                    if node.get('class') == 'processor' and 'product' in node:
-                        processors.append({
-                            'socket': node.get('id', 'unknown'),
-                            'model': node.get('product', 'Unknown'),
-                            'speed_mhz': node.get('configuration', {}).get('cores', 'unknown'),
-                            'cores': node.get('configuration', {}).get('cores', 'unknown'),
-                            'threads': node.get('configuration', {}).get('threads', 'unknown')
-                        })
-                    
-                    # Рекурсивно проверяем дочерние элементы
-                    if 'children' in node:
-                        for child in node['children']:
-                            search_node(child)
-                
-                elif isinstance(node, list):
-                    for item in node:
-                        search_node(item)
-            
-            search_node(data)
-            return processors
-        
-        cpus_cur = find_processors(cur)
+        # 4.2.6.1 Анализ процессоров и сбор PCI устройств за один обход lshw
+        cpus_cur = []
+        pci_devices = []
+        pci_by_class = Counter()
+        
+        def processor_visitor(node):
+            if node.get('class') == 'processor' and 'product' in node:
+                config = node.get('configuration', {})
+                cpus_cur.append({
+                    'socket': node.get('id', 'unknown'),
+                    'model': node.get('product', 'Unknown'),
+                    'speed_mhz': config.get('cores', 'unknown'),
+                    'cores': config.get('cores', 'unknown'),
+                    'threads': config.get('threads', 'unknown')
+                })
+        
+        def pci_visitor(node):
+            entry = lshw_pci_entry(node)
+            if entry is not None:
+                pci_devices.append(entry)
+                pci_by_class[entry['class']] += 1
+        
+        def nvme_visitor(node):
+            # NVMe контроллер (class storage, /dev/nvmeN), диски - его namespace-узлы
+            name = node.get('logicalname')
+            if node.get('class') == 'storage' and isinstance(name, str) and name.startswith('/dev/nvme'):
+                namespaces = [c for c in node.get('children', []) if c.get('class') == 'disk'] or [node]
+                for ns in namespaces:
+                    ns_name = ns.get('logicalname', name)
+                    if isinstance(ns_name, list):
+                        ns_name = ns_name[0]
+                    nvme_disks.append({
+                        'name': os.path.basename(ns_name),
+                        'model': node.get('product'),
+                        'size': ns.get('size'),
+                        'type': 'disk'
+                    })
+        
+        nvme_disks = []
+        walk_lshw(cur, [processor_visitor, pci_visitor, nvme_visitor])
         results['cpus'] = {'found': len(cpus_cur), 'expected': len(reference.get('processors', []))}
         
         # 4.2.6.2 Улучшенная проверка DIMM с детальным анализом
-        dimm_out = run(['dmidecode', '-t', '17'], log)
         dimms = []
         current_dimm = {}
         for line in dimm_out.splitlines():
-            line = line.strip()
+            line = line.lstrip()
             if line.startswith('Memory Device'):
                 if current_dimm:
                     dimms.append(current_dimm)
                 current_dimm = {}
-            elif ':' in line:
-                key, value = line.split(':', 1)
-                current_dimm[key.strip()] = value.strip()
+            else:
+                sep = line.find(':')
+                if sep <= 0:
+                    continue
+                key = line[:sep].rstrip()
+                if key in _DIMM_FIELDS:
+                    current_dimm[key] = line[sep + 1:].strip()
         if current_dimm:
             dimms.append(current_dimm)
         
@@ -1023,56 +1738,50 @@ def step_detailed_inventory(conf, reference):
         memory_config = check_memory_configuration(dimms)
         results['memory_configuration'] = memory_config
         
-        # 4.2.6.3.4 Check NVMe Disks
-        nvme_out = run(['lsblk', '-J', '-o', 'NAME,MODEL,SIZE,TYPE'], log, accept_rc=[0, 1])
-        try:
-            nvme_data = json.loads(nvme_out)
-            nvme_disks = [d for d in nvme_data.get('blockdevices', []) if d.get('name', '').startswith('nvme')]
-            results['nvme_disks'] = {'found': len(nvme_disks), 'details': nvme_disks}
-        except json.JSONDecodeError as e:
-            results['nvme_disks'] = {'found': 0, 'error': f'Failed to parse lsblk JSON output: {e}'}
-        except Exception as e:
-            results['nvme_disks'] = {'found': 0, 'error': f'Failed to process NVMe data: {e}'}
+        # 4.2.6.3.4 Check NVMe Disks (из дерева lshw; lsblk - если lshw их не показал)
+        if nvme_disks:
+            results['nvme_disks'] = {'found': len(nvme_disks), 'details': nvme_disks, 'source': 'lshw'}
+        else:
+            nvme_out = run(['lsblk', '-J', '-o', 'NAME,MODEL,SIZE,TYPE'], log, accept_rc=[0, 1])
+            try:
+                nvme_data = json.loads(nvme_out)
+                nvme_disks = [d for d in nvme_data.get('blockdevices', []) if d.get('name', '').startswith('nvme')]
+                results['nvme_disks'] = {'found': len(nvme_disks), 'details': nvme_disks, 'source': 'lsblk'}
+            except json.JSONDecodeError as e:
+                results['nvme_disks'] = {'found': 0, 'error': f'Failed to parse lsblk JSON output: {e}'}
+            except Exception as e:
+                results['nvme_disks'] = {'found': 0, 'error': f'Failed to process NVMe data: {e}'}
         
         # 4.2.6.3.5 Check SATA Disks  
         sata_disks = []
         try:
-            for device in glob.glob('/dev/sd*'):
-                if not device[-1].isdigit():  # исключаем разделы
-                    try:
-                        model_out = run(['hdparm', '-I', device], log, accept_rc=[0, 1], timeout=30)
-                        model_line = next((l for l in model_out.splitlines() if 'Model Number:' in l), '')
-                        if model_line:
-                            model = model_line.split(':', 1)[1].strip()
-                            sata_disks.append({'device': device, 'model': model})
-                    except Exception as e:
-                        print(f"⚠️  Ошибка при проверке SATA устройства {device}: {e}")
-                        continue
+            devices = [d for d in glob.glob('/dev/sd*') if not d[-1].isdigit()]  # исключаем разделы
+            if devices:
+                # Диски опрашиваются параллельно, вывод пишется в лог по порядку после опроса
+                with ThreadPoolExecutor(max_workers=min(16, len(devices))) as ex:
+                    probes = [(device, ex.submit(probe_sata, device)) for device in devices]
+                with open(log, 'a', encoding='utf-8') as f:
+                    for device, probe in probes:
+                        try:
+                            model, model_out = probe.result()
+                            f.write(f">>> hdparm -I {device}\n{model_out}\n")
+                            if model:
+                                sata_disks.append({'device': device, 'model': model})
+                        except Exception as e:
+                            print(f"⚠️  Ошибка при проверке SATA устройства {device}: {e}")
+                            continue
         except Exception as e:
             print(f"⚠️  Ошибка при сканировании SATA устройств: {e}")
         results['sata_disks'] = {'found': len(sata_disks), 'details': sata_disks}
         
         # 4.2.6.3.7 Улучшенная проверка PCI устройств
-        try:
-            pci_devices = find_pci_devices(cur)
-            results['pci_devices'] = {
-                'count': len(pci_devices),
-                'devices': pci_devices[:15],  # Первые 15 для краткости
-                'by_class': {}
-            }
-            
-            # Группировка по классам устройств
-            for device in pci_devices:
-                device_class = device.get('class', 'unknown')
-                if device_class not in results['pci_devices']['by_class']:
-                    results['pci_devices']['by_class'][device_class] = 0
-                results['pci_devices']['by_class'][device_class] += 1
-                
-        except Exception as e:
-            results['pci_devices'] = {'error': str(e), 'count': 0}
+        results['pci_devices'] = {
+            'count': len(pci_devices),
+            'devices': pci_devices[:15],  # Первые 15 для краткости
+            'by_class': dict(pci_by_class)  # Группировка по классам собрана при обходе lshw
+        }
         
         # 4.2.6.3.8 AllxUSB3.0 Devices
-        usb_out = run(['lsusb'], log, accept_rc=[0, 1])
         usb3_devices = [l for l in usb_out.splitlines() if '3.' in l or 'USB 3' in l]
         results['usb3_devices'] = {'found': len(usb3_devices), 'details': usb3_devices}
         
@@ -1081,36 +1790,21 @@ def step_detailed_inventory(conf, reference):
         results['lan_status'] = lan_status
         
         # 4.2.6.3.11 Улучшенная проверка батареи CR2032
-        battery_info = enhanced_battery_check(conf)
+        battery_info = enhanced_battery_check(conf, log)
         results['battery_cr2032_enhanced'] = battery_info
         
         # Дополнительная проверка сенсоров для анализа VRM
         try:
-            sensor_out = run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-                             '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-                             'sensor', 'list'], log, timeout=60)
+            sensors = get_sensor_snapshot(conf, log)
             
-            sensors = {}
-            for line in sensor_out.splitlines():
-                parts = line.split('|')
-                if len(parts) >= 4:
-                    name = parts[0].strip()
-                    value = parts[1].strip()
-                    unit = parts[2].strip()
-                    status = parts[3].strip()
-                    
-                    sensors[name] = {
-                        'value': value,
-                        'unit': unit,
-                        'status': status
-                    }
+            sensor_groups = index_sensors(sensors)
             
             # Анализ PCIe слотов
-            pci_analysis = validate_pci_slots(cur, sensors)  # Передаем разобранный cur вместо content
+            pci_analysis = validate_pci_slots(pci_devices, sensor_groups['slot_temp'])
             results['pci_slot_analysis'] = pci_analysis
             
             # Анализ VRM температур
-            vrm_analysis = analyze_vrm_temperatures(sensors)
+            vrm_analysis = analyze_vrm_temperatures(sensor_groups['vrm_temp'])
             results['vrm_temperature_analysis'] = vrm_analysis
             
         except Exception as e:
@@ -1175,7 +1869,7 @@ def step_detailed_inventory(conf, reference):
             results['warning_reasons'] = warning_conditions
         
         RESULT_JSON['results']['detailed_inventory'] = {'status': status, 'details': results}
-        RESULT_JSON['logs']['detailed_inventory'] = str(lshw_json_file)
+        RESULT_JSON['logs']['detailed_inventory'] = log_path('lshw.json')
         print_step("Детальная инвентаризация", status)
         
     except Exception as e:
@@ -1186,6 +1880,11 @@ def step_detailed_inventory(conf, reference):
         }
         print_step("Детальная инвентаризация", "ERROR")
 
+# Типы нарушений SensorValidator, которые считаются критическими
+_CRITICAL_VIOLATION_TYPES = frozenset({
+    'UNDERVOLTAGE', 'OVERVOLTAGE', 'OVERTEMPERATURE', 'FAN_STOPPED', 'OVERPOWER', 'CRITICAL_STATUS'
+})
+
 def step_sensor_readings(conf, reference):
     """Шаг 4.2.8. Полная валидация показаний сенсоров согласно TRD 4.2.8.2.1-4.2.8.2.4"""
     print_step("Полная валидация сенсоров", "START")
@@ -1200,7 +1899,7 @@ def step_sensor_readings(conf, reference):
     
     try:
         # Используем новый расширенный валидатор сенсоров
-        limits_file = REF_ROOT / 'sensor_limits.json'
+        limits_file = SENSOR_REF_PATH
         
         if not limits_file.exists():
             print(f"⚠️  Файл пределов сенсоров не найден: {limits_file}")
@@ -1212,18 +1911,16 @@ def step_sensor_readings(conf, reference):
             return
         
         # Создаем валидатор и выполняем полную проверку
+        # Один свежий 'sensor list' через общую IPMI сессию: он же пишется в
+        # традиционный лог для совместимости и обновляет общий снимок сенсоров
+        sensors = get_sensor_snapshot(conf, log, max_age=0)
         sensor_validator = SensorValidator(str(limits_file))
-        validation_results = sensor_validator.perform_full_validation(conf)
+        validation_results = sensor_validator.perform_full_validation(conf, sensors=sensors)
         
         # Сохраняем детальный отчет
         validation_report_path = LOG_ROOT / 'sensor_validation_report.json'
         sensor_validator.save_validation_report(validation_results, str(validation_report_path))
         
-        # Также сохраняем традиционный лог для совместимости
-        run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-             '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-             'sensor', 'list'], log)
-        
         # Анализируем результаты валидации
         overall_status = validation_results['overall_status']
         summary = validation_results['summary']
@@ -1279,8 +1976,7 @@ def step_sensor_readings(conf, reference):
         
         for category_name, category_result in category_results.items():
             for violation in category_result.get('violations', []):
-                if violation.get('type') in ['UNDERVOLTAGE', 'OVERVOLTAGE', 'OVERTEMPERATURE', 
-                                           'FAN_STOPPED', 'OVERPOWER', 'CRITICAL_STATUS']:
+                if violation.get('type') in _CRITICAL_VIOLATION_TYPES:
                     critical_violations.append(f"{category_name}: {violation.get('message', 'Unknown error')}")
                 else:
                     warning_violations.append(f"{category_name}: {violation.get('message', 'Unknown error')}")
@@ -1305,8 +2001,8 @@ def step_sensor_readings(conf, reference):
             'status': overall_status,
             'details': results
         }
-        RESULT_JSON['logs']['sensor_readings'] = str(log)
-        RESULT_JSON['logs']['sensor_validation'] = str(validation_report_path)
+        RESULT_JSON['logs']['sensor_readings'] = log_path('sensor_readings.log')
+        RESULT_JSON['logs']['sensor_validation'] = log_path('sensor_validation_report.json')
         
         print_step("Полная валидация сенсоров", overall_status)
         
@@ -1318,38 +2014,61 @@ def step_sensor_readings(conf, reference):
         }
         print_step("Полная валидация сенсоров", "ERROR")
 
+# Допуски напряжений упрощенной валидации (порядок важен: 1V05 проверяется раньше 1V)
+_VOLTAGE_SPEC_TABLE = {
+    '12V': {'min': 10.5, 'max': 13.5, 'nominal': 12.0},
+    '5V': {'min': 4.5, 'max': 5.5, 'nominal': 5.0},
+    '3V3': {'min': 3.0, 'max': 3.6, 'nominal': 3.3},
+    '1V8': {'min': 1.6, 'max': 2.0, 'nominal': 1.8},
+    '1V05': {'min': 0.9, 'max': 1.2, 'nominal': 1.05},
+    '1V': {'min': 0.9, 'max': 1.15, 'nominal': 1.0}
+}
+# Варианты написания в именах сенсоров (12V, 12V_, ...) считаются один раз при загрузке
+_VOLTAGE_SPECS = tuple(
+    (tuple(dict.fromkeys((name, name.replace('V', 'V_'), name.replace('.', '')))), spec)
+    for name, spec in _VOLTAGE_SPEC_TABLE.items()
+)
+
+@functools.lru_cache(maxsize=None)
+def _match_voltage_spec(voltage_name: str) -> Optional[Dict[str, float]]:
+    """Допуск для сенсора напряжения по имени (None - имя не соответствует ни одной шине)"""
+    for fragments, spec in _VOLTAGE_SPECS:
+        if any(fragment in voltage_name for fragment in fragments):
+            return spec
+    return None
+
+# Значение напряжения из предупреждения "<имя>: Out of range <V>V (expected ...)"
+_OUT_OF_RANGE_VOLT_RE = re.compile(r'Out of range\s+([-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)V')
+
+# Статусы, при которых сенсор не считается критическим (ok обрабатывается отдельно)
+_NON_CRITICAL_STATUSES = frozenset({'ns', 'na'})
+# Нормальные состояния дискретных сенсоров
+_NORMAL_DISCRETE_STATUSES = frozenset({'0x0080', '0x8080', '0x0180'})
+
 def step_sensor_readings_legacy(conf, reference):
     """Устаревшая валидация сенсоров - для совместимости"""
     print_step("Чтение сенсоров (упрощенная)", "START")
     log = LOG_ROOT / 'sensor_readings.log'
     results = {}
     
-    # Получаем все сенсоры через IPMI
-    sensor_out = run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-                     '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-                     'sensor', 'list'], log)
-    
-    sensors = {}
-    for line in sensor_out.splitlines():
-        parts = line.split('|')
-        if len(parts) >= 4:
-            name = parts[0].strip()
-            value = parts[1].strip()
-            unit = parts[2].strip()
-            status = parts[3].strip()
-            
-            sensors[name] = {
-                'value': value,
-                'unit': unit,
-                'status': status
-            }
-    
-    # Категоризация сенсоров (старая логика)
-    voltage_sensors = {k: v for k, v in sensors.items() if 'volt' in k.lower() or v['unit'] == 'Volts'}
-    current_sensors = {k: v for k, v in sensors.items() if 'current' in k.lower() or v['unit'] == 'Amps'}
-    power_sensors = {k: v for k, v in sensors.items() if 'power' in k.lower() or v['unit'] == 'Watts'}
-    temp_sensors = {k: v for k, v in sensors.items() if 'temp' in k.lower() or v['unit'] == 'degrees C'}
-    fan_sensors = {k: v for k, v in sensors.items() if 'fan' in k.lower() or v['unit'] == 'RPM'}
+    # Получаем все сенсоры через IPMI (общий снимок)
+    sensors = get_sensor_snapshot(conf, log)
+    
+    # Категоризация сенсоров (старая логика) за один проход
+    voltage_sensors, current_sensors, power_sensors, temp_sensors, fan_sensors = {}, {}, {}, {}, {}
+    categories = (
+        (voltage_sensors, 'volt', 'Volts'),
+        (current_sensors, 'current', 'Amps'),
+        (power_sensors, 'power', 'Watts'),
+        (temp_sensors, 'temp', 'degrees C'),
+        (fan_sensors, 'fan', 'RPM'),
+    )
+    for name, sensor in sensors.items():
+        low = name.casefold()
+        unit = sensor['unit']
+        for bucket, keyword, bucket_unit in categories:
+            if unit == bucket_unit or keyword in low:
+                bucket[name] = sensor
     
     results['voltage_sensors'] = voltage_sensors
     results['current_sensors'] = current_sensors  
@@ -1358,62 +2077,54 @@ def step_sensor_readings_legacy(conf, reference):
     results['fan_sensors'] = fan_sensors
     
     # Анализ VRM температур (старая логика)
-    vrm_analysis = analyze_vrm_temperatures(sensors)
+    vrm_analysis = analyze_vrm_temperatures(index_sensors(sensors)['vrm_temp'])
     results['vrm_analysis'] = vrm_analysis
     
-    # Проверка вентиляторов (старая логика)
+    # Проверка вентиляторов (старая логика); reading уже разобран в parse_sensor_list
     fan_warnings = []
     for fan_name, fan_data in fan_sensors.items():
         if fan_data['value'] != 'na' and fan_data['status'] == 'ok':
-            try:
-                rpm = float(fan_data['value'])
-                if rpm < 1000:
-                    fan_warnings.append(f'{fan_name}: Low RPM {rpm}')
-                elif rpm < 1500:
-                    fan_warnings.append(f'{fan_name}: Warning RPM {rpm}')
-            except ValueError:
+            rpm = fan_data['reading']
+            if rpm is None:
                 fan_warnings.append(f'{fan_name}: Invalid RPM value {fan_data["value"]}')
+            elif rpm < 1000:
+                fan_warnings.append(f'{fan_name}: Low RPM {rpm}')
+            elif rpm < 1500:
+                fan_warnings.append(f'{fan_name}: Warning RPM {rpm}')
     
     # Улучшенная проверка напряжений (старая логика)
     voltage_warnings = []
-    voltage_specs = {
-        '12V': {'min': 10.5, 'max': 13.5, 'nominal': 12.0},
-        '5V': {'min': 4.5, 'max': 5.5, 'nominal': 5.0},
-        '3V3': {'min': 3.0, 'max': 3.6, 'nominal': 3.3},
-        '1V8': {'min': 1.6, 'max': 2.0, 'nominal': 1.8},
-        '1V05': {'min': 0.9, 'max': 1.2, 'nominal': 1.05},
-        '1V': {'min': 0.9, 'max': 1.15, 'nominal': 1.0}
-    }
-    
     for voltage_name, voltage_data in voltage_sensors.items():
         if voltage_data['value'] != 'na' and voltage_data['status'] == 'ok':
-            try:
-                voltage = float(voltage_data['value'])
-                for spec_name, spec in voltage_specs.items():
-                    if (spec_name in voltage_name or 
-                        spec_name.replace('V', 'V_') in voltage_name or
-                        spec_name.replace('.', '') in voltage_name):
-                        if voltage < spec['min'] or voltage > spec['max']:
-                            voltage_warnings.append(
-                                f'{voltage_name}: Out of range {voltage}V (expected {spec["min"]}-{spec["max"]}V)'
-                            )
-                        break
-            except ValueError:
+            voltage = voltage_data['reading']
+            if voltage is None:
                 voltage_warnings.append(f'{voltage_name}: Invalid voltage value {voltage_data["value"]}')
+                continue
+            spec = _match_voltage_spec(voltage_name)
+            if spec is not None and (voltage < spec['min'] or voltage > spec['max']):
+                voltage_warnings.append(
+                    f'{voltage_name}: Out of range {voltage}V (expected {spec["min"]}-{spec["max"]}V)'
+                )
     
     # Проверка критических состояний (старая логика)
-    normal_discrete_statuses = ['0x0080', '0x8080', '0x0180']
     critical_sensors = {}
+    active_count = 0
     
+    # Активные и критические сенсоры - за один проход
     for name, sensor_data in sensors.items():
         status = sensor_data['status']
         unit = sensor_data['unit']
         value = sensor_data['value']
         
-        if status in ['ok', 'ns', 'na']:
+        if status == 'ok':
+            if value != 'na':
+                active_count += 1
+            continue
+        
+        if status in _NON_CRITICAL_STATUSES:
             continue
             
-        if unit == 'discrete' and status in normal_discrete_statuses:
+        if unit == 'discrete' and status in _NORMAL_DISCRETE_STATUSES:
             continue
             
         if value == 'na':
@@ -1421,11 +2132,8 @@ def step_sensor_readings_legacy(conf, reference):
             
         critical_sensors[name] = sensor_data
     
-    active_sensors = {k: v for k, v in sensors.items() 
-                     if v['status'] == 'ok' and v['value'] != 'na'}
-    
     results['total_sensors'] = len(sensors)
-    results['active_sensors'] = len(active_sensors)
+    results['active_sensors'] = active_count
     results['critical_sensors'] = critical_sensors
     results['fan_warnings'] = fan_warnings
     results['voltage_warnings'] = voltage_warnings
@@ -1451,15 +2159,12 @@ def step_sensor_readings_legacy(conf, reference):
     if voltage_warnings:
         critical_voltage_warnings = []
         for warning in voltage_warnings:
-            if 'Out of range' in warning:
-                try:
-                    voltage_str = warning.split('Out of range ')[1].split('V')[0]
-                    voltage_val = float(voltage_str)
-                    if voltage_val < 1.0 or voltage_val > 15.0:
-                        critical_voltage_warnings.append(warning)
-                except (ValueError, IndexError) as e:
-                    print(f"⚠️  Ошибка парсинга значения напряжения '{voltage_str}': {e}")
-                    continue
+            m = _OUT_OF_RANGE_VOLT_RE.search(warning)
+            if m is None:
+                continue
+            voltage_val = float(m.group(1))
+            if voltage_val < 1.0 or voltage_val > 15.0:
+                critical_voltage_warnings.append(warning)
         
         if critical_voltage_warnings:
             if status != 'FAIL':
@@ -1489,13 +2194,41 @@ def step_flash_macs_disabled(conf):
     }
     print_step("Тест MAC адресов (отключен)", "SKIP")
 
-def step_sensors(label: str, conf):
-    """Сбор показаний сенсоров"""
+def step_sensors(label: str, conf) -> Dict[str, float]:
+    """Сбор показаний сенсоров; возвращает температуры {имя: °C} из вывода команды"""
     log = LOG_ROOT / f'sensors_{label}.log'
-    run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-         '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-         'sensor', 'list'], log)
-    RESULT_JSON['logs'][f'sensors_{label}'] = str(log)
+    out = run_ipmi(conf, ['sensor', 'list'], log)
+    RESULT_JSON['logs'][f'sensors_{label}'] = log_path(f'sensors_{label}.log')
+    return parse_temps_from_output(out)
+
+# Строка итогов stress-ng --metrics-brief для стрессора cpu:
+# "stress-ng: info:  [pid] cpu  <bogo ops> <real time> <usr time> <sys time> <bogo ops/s real> ..."
+_STRESS_NG_CPU_RE = re.compile(
+    r'^.*?\]\s+cpu\s+(\d+)\s+([\d.]+)\s+[\d.]+\s+[\d.]+\s+([\d.]+)', re.MULTILINE
+)
+# Итоги fio: "  read: IOPS=12.3k, BW=48.1MiB/s (50.4MB/s)(...)"
+_FIO_RW_RE = re.compile(r'\b(read|write): IOPS=([^,\s]+), BW=(\S+)')
+
+def disk_numa_node(path: str) -> int:
+    """NUMA узел контроллера блочного устройства, на котором лежит path (-1 если неизвестен)"""
+    try:
+        st_dev = os.stat(path).st_dev
+        dev_dir = os.path.realpath(f'/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}')
+    except OSError:
+        return -1
+    if os.path.exists(os.path.join(dev_dir, 'partition')):
+        dev_dir = os.path.dirname(dev_dir)
+    # numa_node есть у PCI устройства - поднимаемся от блочного устройства вверх по дереву
+    node_dir = os.path.realpath(os.path.join(dev_dir, 'device'))
+    while node_dir.startswith('/sys/devices/'):
+        value = read_sysfs(os.path.join(node_dir, 'numa_node'))
+        if value is not None:
+            try:
+                return int(value)
+            except ValueError:
+                return -1
+        node_dir = os.path.dirname(node_dir)
+    return -1
 
 def step_stress(conf):
     """Улучшенное стресс-тестирование с детальным мониторингом"""
@@ -1503,8 +2236,9 @@ def step_stress(conf):
     log = LOG_ROOT / 'stress.log'
     cpu_threads = os.cpu_count() or 4
     
-    # Перед стресс-тестом собираем baseline сенсоров
-    step_sensors('baseline', conf)
+    # Перед стресс-тестом собираем baseline сенсоров (температуры остаются в памяти)
+    baseline_temps = step_sensors('baseline', conf)
+    post_cpu_stress_temps = None
     
     # Улучшенный CPU и память стресс с мониторингом
     try:
@@ -1514,17 +2248,15 @@ def step_stress(conf):
                          '--timeout','60','--metrics-brief'], log, timeout=120)
         
         # Сразу после CPU стресса собираем сенсоры для корректного сравнения температур
-        step_sensors('post_cpu_stress', conf)
+        post_cpu_stress_temps = step_sensors('post_cpu_stress', conf)
         
         # Парсим результаты stress-ng
         stress_metrics = {}
-        for line in cpu_result.splitlines():
-            if 'cpu' in line and 'bogo ops/s' in line:
-                parts = line.split()
-                if len(parts) >= 6:
-                    stress_metrics['cpu_bogo_ops_total'] = parts[3]
-                    stress_metrics['cpu_real_time'] = parts[4]
-                    stress_metrics['cpu_bogo_ops_per_sec'] = parts[7] if len(parts) > 7 else 'unknown'
+        m = _STRESS_NG_CPU_RE.search(cpu_result)
+        if m:
+            stress_metrics['cpu_bogo_ops_total'] = m.group(1)
+            stress_metrics['cpu_real_time'] = m.group(2)
+            stress_metrics['cpu_bogo_ops_per_sec'] = m.group(3)
         
         print_step("Память стресс-тест (1 минута)", "START")  
         # Memory stress: 2 процесса, 70% памяти, 1 минута
@@ -1541,32 +2273,29 @@ def step_stress(conf):
     # Улучшенный Disk stress с FIO
     try:
         print_step("Диск I/O стресс-тест (1 минута)", "START")
-        fio_result = run(['fio','--name','randrw','--ioengine=libaio',
-                         '--iodepth=16','--rw=randrw','--bs=4k',
-                         '--direct=1','--size=1G','--numjobs=4',
-                         '--runtime=60','--group_reporting',
-                         '--filename=/tmp/stress_file'], log, timeout=120)
+        # Число потоков fio по числу ядер: 2..8 (больше 8 на один диск не даёт прироста)
+        fio_jobs = max(2, min(8, cpu_threads // 2))
+        fio_cmd = ['fio','--name','randrw','--ioengine=libaio',
+                   '--iodepth=16','--rw=randrw','--bs=4k',
+                   '--direct=1','--size=1G',f'--numjobs={fio_jobs}',
+                   '--runtime=60','--group_reporting',
+                   '--filename=/tmp/stress_file']
+        # Привязка fio к NUMA узлу контроллера диска: без неё I/O на многосокетных
+        # системах идёт через межпроцессорную шину
+        numa_node = disk_numa_node('/tmp')
+        if numa_node >= 0:
+            node_cpus = read_sysfs(f'/sys/devices/system/node/node{numa_node}/cpulist')
+            if node_cpus:
+                fio_cmd.append(f'--cpus_allowed={node_cpus}')
+            if shutil.which('numactl'):
+                fio_cmd = ['numactl', '-m', str(numa_node), '--cpunodebind', str(numa_node), *fio_cmd]
+        fio_result = run(fio_cmd, log, timeout=120)
         
         # Парсим результаты FIO
         fio_metrics = {}
-        lines = fio_result.splitlines()
-        for i, line in enumerate(lines):
-            if 'read:' in line and 'IOPS=' in line:
-                # Извлекаем IOPS и BW для чтения
-                parts = line.split()
-                for part in parts:
-                    if 'IOPS=' in part:
-                        fio_metrics['read_iops'] = part.split('=')[1]
-                    elif 'BW=' in part:
-                        fio_metrics['read_bw'] = part.split('=')[1]
-            elif 'write:' in line and 'IOPS=' in line:
-                # Извлекаем IOPS и BW для записи
-                parts = line.split()
-                for part in parts:
-                    if 'IOPS=' in part:
-                        fio_metrics['write_iops'] = part.split('=')[1]
-                    elif 'BW=' in part:
-                        fio_metrics['write_bw'] = part.split('=')[1]
+        for m in _FIO_RW_RE.finditer(fio_result):
+            fio_metrics[f'{m.group(1)}_iops'] = m.group(2)
+            fio_metrics[f'{m.group(1)}_bw'] = m.group(3)
         
         RESULT_JSON['results']['stress_disk'] = {'status': 'PASS', 'metrics': fio_metrics}
         
@@ -1578,7 +2307,11 @@ def step_stress(conf):
         baseline_log = LOG_ROOT / 'sensors_baseline.log'
         post_cpu_stress_log = LOG_ROOT / 'sensors_post_cpu_stress.log'
         
-        if baseline_log.exists() and post_cpu_stress_log.exists():
+        if post_cpu_stress_temps is not None:
+            # Оба снимка уже разобраны из вывода ipmitool - повторно логи не читаем
+            temp_comparison = compare_sensor_temperature_dicts(baseline_temps, post_cpu_stress_temps)
+            RESULT_JSON['results']['thermal_impact'] = temp_comparison
+        elif baseline_log.exists() and post_cpu_stress_log.exists():
             temp_comparison = compare_sensor_temperatures(baseline_log, post_cpu_stress_log)
             RESULT_JSON['results']['thermal_impact'] = temp_comparison
         else:
@@ -1603,32 +2336,56 @@ def step_stress(conf):
     RESULT_JSON['results']['stress'] = {'status': overall_status}
     print_step("Стресс-тестирование", overall_status)
 
+# Строка `sensor list` с температурой в статусе ok: (имя, значение)
+_TEMP_LOG_LINE_RE = re.compile(
+    rb'^([^|\n]*)\|[ \t]*([^|\s]+)[ \t]*\|[^|\n]*degrees C[^|\n]*\|[ \t]*ok[ \t]*(?:\||\r?$)',
+    re.MULTILINE
+)
+
+def _parse_temp_buffer(buf) -> Dict[str, float]:
+    """Температуры {имя: °C} из bytes/mmap с выводом `sensor list`"""
+    sensors = {}
+    for m in _TEMP_LOG_LINE_RE.finditer(buf):
+        try:
+            sensors[m.group(1).strip().decode(errors='replace')] = float(m.group(2))
+        except ValueError:
+            pass
+    return sensors
+
+def parse_temps_from_output(output: str) -> Dict[str, float]:
+    """Температуры {имя: °C} из вывода `sensor list`, уже находящегося в памяти"""
+    return _parse_temp_buffer(output.encode()) if output else {}
+
+@functools.lru_cache(maxsize=16)
+def _parse_temp_log(path: str, mtime_ns: int, size: int) -> Dict[str, float]:
+    """Разбор температур из лога `sensor list`; mtime_ns/size - часть ключа кэша"""
+    if size == 0:
+        return {}
+    
+    # Лог отображается в память и разбирается одним проходом регулярного выражения
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _parse_temp_buffer(mm)
+
+def parse_sensors_from_log(log_file: Path) -> Dict[str, float]:
+    """Температуры {имя: °C} из лога сенсоров.
+
+    Результат кэшируется по (путь, mtime, размер): неизменённый лог повторно
+    не разбирается. Возвращается общий словарь - вызывающий код не должен его изменять.
+    """
+    try:
+        st = log_file.stat()
+    except FileNotFoundError:
+        return {}
+    return _parse_temp_log(str(log_file), st.st_mtime_ns, st.st_size)
+
 def compare_sensor_temperatures(baseline_file: Path, post_stress_file: Path) -> Dict:
-    """Сравнение температур до и после стресс-теста"""
-    def parse_sensors_from_log(log_file: Path) -> Dict:
-        sensors = {}
-        if not log_file.exists():
-            return sensors
-            
-        with log_file.open('r') as f:
-            for line in f:
-                if '|' in line and 'degrees C' in line:
-                    parts = line.split('|')
-                    if len(parts) >= 4:
-                        name = parts[0].strip()
-                        value = parts[1].strip()
-                        status = parts[3].strip()
-                        
-                        if value != 'na' and status == 'ok':
-                            try:
-                                sensors[name] = float(value)
-                            except ValueError:
-                                pass
-        return sensors
-    
-    baseline_temps = parse_sensors_from_log(baseline_file)
-    post_stress_temps = parse_sensors_from_log(post_stress_file)
-    
+    """Сравнение температур до и после стресс-теста по логам сенсоров"""
+    return compare_sensor_temperature_dicts(parse_sensors_from_log(baseline_file),
+                                            parse_sensors_from_log(post_stress_file))
+
+def compare_sensor_temperature_dicts(baseline_temps: Dict[str, float],
+                                     post_stress_temps: Dict[str, float]) -> Dict:
+    """Сравнение температур до и после стресс-теста по уже разобранным снимкам"""
     comparison = {
         'baseline_sensors': len(baseline_temps),
         'post_stress_sensors': len(post_stress_temps),
@@ -1637,23 +2394,21 @@ def compare_sensor_temperatures(baseline_file: Path, post_stress_file: Path) ->
         'max_temp_increase': 0.0
     }
     
-    for sensor_name in baseline_temps:
-        if sensor_name in post_stress_temps:
-            delta = post_stress_temps[sensor_name] - baseline_temps[sensor_name]
-            comparison['temperature_deltas'][sensor_name] = {
-                'baseline': baseline_temps[sensor_name],
-                'post_stress': post_stress_temps[sensor_name],
-                'delta': delta
-            }
-            
-            if delta > comparison['max_temp_increase']:
-                comparison['max_temp_increase'] = delta
-                
-            # Проверка значительного роста температуры
-            if delta > 20.0:  # Рост больше 20°C
-                comparison['warnings'].append(f'{sensor_name}: Large temp increase +{delta:.1f}°C')
-            elif delta > 15.0:  # Рост больше 15°C
-                comparison['warnings'].append(f'{sensor_name}: Significant temp increase +{delta:.1f}°C')
+    # Дельты по сенсорам, присутствующим в обоих логах (порядок - как в baseline)
+    deltas = {name: post_stress_temps[name] - baseline
+              for name, baseline in baseline_temps.items() if name in post_stress_temps}
+    comparison['temperature_deltas'] = {
+        name: {'baseline': baseline_temps[name], 'post_stress': post_stress_temps[name], 'delta': delta}
+        for name, delta in deltas.items()
+    }
+    comparison['max_temp_increase'] = max(0.0, max(deltas.values(), default=0.0))
+    
+    # Проверка значительного роста температуры
+    for sensor_name, delta in deltas.items():
+        if delta > 20.0:  # Рост больше 20°C
+            comparison['warnings'].append(f'{sensor_name}: Large temp increase +{delta:.1f}°C')
+        elif delta > 15.0:  # Рост больше 15°C
+            comparison['warnings'].append(f'{sensor_name}: Significant temp increase +{delta:.1f}°C')
     
     # Статус сравнения
     if comparison['max_temp_increase'] > 25.0:
@@ -1665,14 +2420,22 @@ def compare_sensor_temperatures(baseline_file: Path, post_stress_file: Path) ->
     
     return comparison
 
+def count_dir_entries(path: str, prefix: str) -> int:
+    """Число записей каталога с заданным префиксом имени (0, если каталога нет)"""
+    try:
+        with os.scandir(path) as it:
+            return sum(1 for entry in it if entry.name.startswith(prefix))
+    except OSError:
+        return 0
+
 def step_fp1_test(conf):
     """Шаг 4.2.6.2. Тестирование блока выводов FP_1 (заглушка)"""
     log = LOG_ROOT / 'fp1_test.log'
     
     # Проверка GPIO через sysfs если доступно
-    gpio_paths = glob.glob('/sys/class/gpio/gpio*')
+    gpio_count = count_dir_entries('/sys/class/gpio', 'gpio')
     results = {
-        'gpio_count': len(gpio_paths),
+        'gpio_count': gpio_count,
         'status': 'WARNING',
         'message': 'FP_1 testing requires specialized hardware module (ESP32)'
     }
@@ -1684,10 +2447,10 @@ def step_fp1_test(conf):
     
     with log.open('w') as f:
         f.write('FP_1 testing placeholder - requires ESP32 module integration\n')
-        f.write(f'Found {len(gpio_paths)} GPIO interfaces\n')
+        f.write(f'Found {gpio_count} GPIO interfaces\n')
     
     RESULT_JSON['results']['fp1_test'] = {'status': 'WARNING', 'details': results}
-    RESULT_JSON['logs']['fp1_test'] = str(log)
+    RESULT_JSON['logs']['fp1_test'] = log_path('fp1_test.log')
 
 def step_vga_test(conf):
     """Шаг 4.2.6.3.9. Проверка VGA выхода"""
@@ -1704,8 +2467,8 @@ def step_vga_test(conf):
         }
         
         # Проверяем модуль framebuffer
-        fb_devices = glob.glob('/dev/fb*')
-        results['framebuffer_devices'] = len(fb_devices)
+        fb_devices = count_dir_entries('/dev', 'fb')
+        results['framebuffer_devices'] = fb_devices
         
         status = 'PASS' if vga_devices and fb_devices else 'FAIL'
         results['status'] = status
@@ -1716,6 +2479,9 @@ def step_vga_test(conf):
     
     RESULT_JSON['results']['vga_test'] = {'status': status, 'details': results}
 
+# Строки dmesg/lsmod с упоминанием i3c
+_I3C_LINE_RE = re.compile(r'^.*i3c.*$', re.IGNORECASE | re.MULTILINE)
+
 def step_i3c_scan(conf):
     """Улучшенное сканирование шины i3c"""
     print_step("I3C сканирование", "START") 
@@ -1742,7 +2508,7 @@ def step_i3c_scan(conf):
             # Метод 2: Поиск через dmesg
             try:
                 dmesg_out = run(['dmesg'], log, accept_rc=[0, 1])
-                i3c_lines = [l for l in dmesg_out.splitlines() if 'i3c' in l.lower()]
+                i3c_lines = _I3C_LINE_RE.findall(dmesg_out)
                 if i3c_lines:
                     results['dmesg_i3c_lines'] = len(i3c_lines)
                     results['i3c_dmesg_entries'] = i3c_lines[:5]  # Первые 5 строк
@@ -1757,7 +2523,7 @@ def step_i3c_scan(conf):
             # Метод 3: Проверка модулей ядра
             try:
                 lsmod_out = run(['lsmod'], log, accept_rc=[0, 1])
-                i3c_modules = [l for l in lsmod_out.splitlines() if 'i3c' in l.lower()]
+                i3c_modules = _I3C_LINE_RE.findall(lsmod_out)
                 if i3c_modules:
                     results['i3c_kernel_modules'] = i3c_modules
                     results['methods_tried'].append('kernel_modules_found')
@@ -1783,64 +2549,115 @@ def step_i3c_scan(conf):
         results['message'] = f'i3c scan error: {str(e)}'
     
     # Логирование результатов
-    with log.open('w') as f:
-        f.write('i3c bus scanning - enhanced implementation\n')
-        f.write(f'Methods tried: {results["methods_tried"]}\n')
-        f.write(json.dumps(results, indent=2))
+    # Одна запись: methods_tried уже входит в JSON результатов
+    log.write_bytes(b'i3c bus scanning - enhanced implementation\n' + encode_json(results, pretty=True))
     
     RESULT_JSON['results']['i3c_scan'] = results
-    RESULT_JSON['logs']['i3c_scan'] = str(log)
+    RESULT_JSON['logs']['i3c_scan'] = log_path('i3c_scan.log')
     print_step("I3C сканирование", results['status'])
 
-def step_sel_analyse(conf):
-    """Анализ SEL логов с правильным timing"""
+# Ключевые слова критических событий SEL
+_SEL_CRIT_RE = re.compile(
+    r'fatal|critical|thermal shutdown|thermal trip|overtemperature|overvoltage|'
+    r'undervoltage|power fail|system boot|watchdog|panic',
+    re.IGNORECASE
+)
+
+def is_critical_sel_line(line: str) -> bool:
+    """Критичность записи `sel elist` по ключевым словам _SEL_CRIT_RE.
+
+    Пороговые события (5-я колонка: 'Upper Critical going high', 'Lower
+    Non-critical going low' и т.п.) содержат 'critical' и совпали бы с
+    регулярным выражением - для них поиск по всей строке не выполняется.
+    """
+    cols = line.split('|', 5)
+    if len(cols) > 4 and 'critical' in cols[4].casefold():
+        return True
+    return _SEL_CRIT_RE.search(line) is not None
+
+# Счётчик записей и время последнего добавления в `ipmitool sel info`
+_SEL_INFO_RE = re.compile(r'^\s*(Entries|Last Add Time)\s*:\s*(.*?)\s*$', re.MULTILINE)
+
+def sel_info_marker(conf, log_file: Path) -> Optional[Tuple[str, str]]:
+    """(Entries, Last Add Time) из `ipmitool sel info`; None, если не удалось получить.
+
+    Совпадение маркеров до и после стресс-теста означает, что в SEL не
+    добавлено записей (Last Add Time меняется и при переполнении с перезаписью).
+    """
+    try:
+        fields = dict(_SEL_INFO_RE.findall(run_ipmi(conf, ['sel', 'info'], log_file)))
+    except RuntimeError:
+        return None
+    if 'Entries' not in fields or 'Last Add Time' not in fields:
+        return None
+    return fields['Entries'], fields['Last Add Time']
+
+def step_sel_before(conf) -> Tuple[Optional[Path], Optional[Tuple[str, str]]]:
+    """Снимок SEL до стресс-теста (sel_before.log) и маркер `sel info`; None, если снять не удалось"""
+    before = LOG_ROOT / 'sel_before.log'
+    try:
+        run_ipmi(conf, ['sel', 'elist'], before)
+    except RuntimeError as e:
+        RESULT_JSON['warnings'].append(f'SEL snapshot before stress failed: {e}')
+        return None, None
+    return before, sel_info_marker(conf, LOG_ROOT / 'sel_info.log')
+
+def step_sel_analyse(conf, before: Optional[Path] = None, before_marker: Optional[Tuple[str, str]] = None):
+    """Анализ SEL логов с правильным timing.
+
+    before - снимок SEL, снятый step_sel_before до стресс-теста; без него
+    снимок BEFORE снимается здесь же. before_marker - маркер `sel info` того же
+    момента: если он не изменился, полный SEL повторно не читается и не сравнивается.
+    """
     print_step("Анализ SEL", "START")
     
-    before = LOG_ROOT / 'sel_before.log'
     after  = LOG_ROOT / 'sel_after.log'
     diff   = LOG_ROOT / 'sel_diff.log'
     
-    # Собираем SEL BEFORE - до выполнения потенциально опасных операций
-    run(['ipmitool','-I','lanplus','-H',conf['bmc_ip'],
-         '-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-         'sel','elist'], before)
-    
-    # ВАЖНО: здесь должны быть выполнены стресс-тесты или другие операции
-    # Пока что добавляем небольшую паузу для имитации операций
-    import time
-    time.sleep(2)
+    if before is None:
+        # Собираем SEL BEFORE здесь - новые записи появятся только за паузу
+        before = LOG_ROOT / 'sel_before.log'
+        run_ipmi(conf, ['sel', 'elist'], before)
+        time.sleep(2)
+    elif before_marker is not None and sel_info_marker(conf, LOG_ROOT / 'sel_info.log') == before_marker:
+        # Новых записей нет - sel elist и сравнение не нужны
+        diff.write_bytes(b'')
+        RESULT_JSON['results']['sel'] = {
+            'status':'PASS',
+            'details': {'message': 'No new SEL entries detected (sel info unchanged)'}
+        }
+        RESULT_JSON['logs']['sel_diff'] = log_path('sel_diff.log')
+        print_step("Анализ SEL", "PASS")
+        return
     
     # Собираем SEL AFTER - после выполнения операций
-    run(['ipmitool','-I','lanplus','-H',conf['bmc_ip'],
-         '-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-         'sel','elist'], after)
+    run_ipmi(conf, ['sel', 'elist'], after)
     
     # Вычисляем diff между before и after
     with before.open() as fb, after.open() as fa, diff.open('w') as fd:
-        set_before = set(fb.readlines())
-        new_entries_found = False
+        # Запись SEL однозначно определяется record ID (первая колонка) - храним только его
+        set_before = {line.split('|', 1)[0].strip() for line in fb}
+        new_lines = []
+        critical_line = None
         
         for line in fa:
-            if line not in set_before:
-                fd.write(line)
-                new_entries_found = True
-                # Проверяем на критические события - ищем во всей строке
-                line_lower = line.lower()
-                if any(keyword in line_lower for keyword in [
-                    'fatal', 'critical', 'thermal shutdown', 'thermal trip',
-                    'overtemperature', 'overvoltage', 'undervoltage',
-                    'power fail', 'system boot', 'watchdog', 'panic'
-                ]):
-                    RESULT_JSON['results']['sel'] = {
-                        'status':'FAIL',
-                        'details': {'critical_event_found': line.strip()}
-                    }
-                    RESULT_JSON['logs']['sel_diff'] = str(diff)
-                    print_step("Анализ SEL", "FAIL")
-                    return
+            if line.split('|', 1)[0].strip() not in set_before:
+                new_lines.append(line)
+                # Проверяем на критические события
+                if is_critical_sel_line(line):
+                    critical_line = line
+                    break
         
+        # Новые записи пишутся в diff одним вызовом
+        fd.writelines(new_lines)
+        
+        if critical_line is not None:
+            RESULT_JSON['results']['sel'] = {
+                'status':'FAIL',
+                'details': {'critical_event_found': critical_line.strip()}
+            }
         # Если найдены новые записи, но не критические
-        if new_entries_found:
+        elif new_lines:
             RESULT_JSON['results']['sel'] = {
                 'status':'WARNING',
                 'details': {'new_entries_found': 'Non-critical entries detected'}
@@ -1851,81 +2668,125 @@ def step_sel_analyse(conf):
                 'details': {'message': 'No new SEL entries detected'}
             }
     
-    RESULT_JSON['logs']['sel_diff'] = str(diff)
+    RESULT_JSON['logs']['sel_diff'] = log_path('sel_diff.log')
     status = RESULT_JSON['results']['sel']['status']
     print_step("Анализ SEL", status)
 
 def find_pci_devices(lshw_data):
-    """Извлекает PCIe устройства из lshw данных"""
+    """Извлекает PCIe устройства из lshw данных (итеративный обход, без рекурсии)"""
+    devices = []
     
-    def extract_pci_from_node(node):
-        """Рекурсивно извлекает PCIe устройства из узла lshw"""
-        devices = []
-        
-        # Проверяем если текущий узел - PCIe устройство
-        if ('businfo' in node and node['businfo'].startswith('pci@') and 
-            'description' in node):
-            devices.append({
-                'bdf': node['businfo'].replace('pci@', '') + f" {node.get('description', 'Unknown')}",
-                'description': node.get('description', 'Unknown device'),
-                'class': node.get('description', 'Unknown'),
-                'width': node.get('width', 'unknown'),
-                'speed': node.get('speed', 'unknown')
-            })
-        
-        # Рекурсивно обрабатываем дочерние узлы
-        if 'children' in node:
-            for child in node['children']:
-                devices.extend(extract_pci_from_node(child))
-        
-        return devices
+    def pci_visitor(node):
+        entry = lshw_pci_entry(node)
+        if entry is not None:
+            devices.append(entry)
     
-    return extract_pci_from_node(lshw_data)
+    walk_lshw(lshw_data, [pci_visitor])
+    return devices
+
+def read_sysfs(path: str) -> Optional[str]:
+    """Значение атрибута sysfs (None, если атрибут отсутствует или недоступен).
+
+    Атрибут читается одним os.read без буферизованного текстового файла:
+    sysfs отдаёт значение атрибута (не больше страницы) за один read.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        return os.read(fd, 4096).decode('utf-8', errors='replace').strip()
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+# Строки ethtool со скоростью, дуплексом и наличием линка: (поле, значение)
+_ETHTOOL_KV_RE = re.compile(r'^\s*(Speed|Duplex|Link detected):[ \t]*(.*?)[ \t]*$', re.MULTILINE)
+# Заголовок интерфейса в `ip link show`: "2: eth0@if3: <FLAGS> ..." -> имя
+_IP_LINK_IFACE_RE = re.compile(r'^\d+:\s+([^:@\s]+)(?:@[^:\s]*)?:')
+# Строка с MAC адресом в `ip link show`
+_IP_LINK_MAC_RE = re.compile(r'^\s+link/ether\s+(\S+)')
+
+def _sysfs_link_fields(iface_name: str) -> Optional[List[tuple]]:
+    """Поля Speed/Duplex/Link detected в формате ethtool из /sys/class/net.
+
+    None - у интерфейса нет атрибутов линка в sysfs (нужен ethtool). У опущенного
+    интерфейса speed/duplex/carrier не читаются - как "Unknown!"/"no" в ethtool.
+    """
+    base = f'/sys/class/net/{iface_name}/'
+    if not os.path.exists(base + 'speed'):
+        return None
+    speed = read_sysfs(base + 'speed')
+    duplex = read_sysfs(base + 'duplex')
+    return [
+        ('Speed', f'{speed}Mb/s' if speed and speed != '-1' else 'Unknown!'),
+        ('Duplex', duplex.capitalize() if duplex and duplex != 'unknown' else 'Unknown! (255)'),
+        ('Link detected', 'yes' if read_sysfs(base + 'carrier') == '1' else 'no'),
+    ]
+
+def _ethtool_interface_status(iface_name: str, up: bool) -> Dict:
+    """Статус интерфейса через ethtool (если в sysfs нет нужных атрибутов)"""
+    try:
+        ethtool_result = subprocess.run(['ethtool', iface_name], 
+                                      capture_output=True, text=True, timeout=10)
+        if ethtool_result.returncode == 0:
+            fields = {}
+            for key, value in _ETHTOOL_KV_RE.findall(ethtool_result.stdout):
+                fields.setdefault(key, value)
+            speed = fields.get('Speed')
+            
+            return {
+                'speed': speed.split()[-1] if speed else 'unknown',
+                'link': 'yes' in fields.get('Link detected', '').lower(),
+                'status': 'UP' if up else 'DOWN'
+            }
+        return {'error': f'ethtool failed: {ethtool_result.stderr.strip()}'}
+    except subprocess.TimeoutExpired:
+        return {'error': 'ethtool timeout'}
+    except Exception as e:
+        return {'error': f'ethtool error: {str(e)}'}
 
 def check_network_interfaces():
-    """Улучшенная проверка сетевых интерфейсов"""
+    """Улучшенная проверка сетевых интерфейсов.
+
+    Состояние читается из /sys/class/net без запуска процессов;
+    ethtool вызывается только для интерфейсов без атрибутов в sysfs.
+    """
     interfaces_status = {}
     
     try:
-        # Получаем список всех сетевых интерфейсов
-        result = subprocess.run(['ip', 'link', 'show'], capture_output=True, text=True, timeout=30)
-        if result.returncode == 0:
-            # Парсим вывод ip link show
-            for line in result.stdout.splitlines():
-                if ': ' in line and not line.startswith(' '):
-                    # Строка вида "2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500"
-                    parts = line.split(': ')
-                    if len(parts) >= 2:
-                        iface_name = parts[1].split('@')[0]  # убираем @if... если есть
-                        if iface_name.startswith(('eth', 'ens', 'enp')):
-                            # Проверяем статус интерфейса через ethtool
-                            try:
-                                ethtool_result = subprocess.run(['ethtool', iface_name], 
-                                                              capture_output=True, text=True, timeout=10)
-                                if ethtool_result.returncode == 0:
-                                    speed_line = next((l for l in ethtool_result.stdout.splitlines() 
-                                                     if 'Speed:' in l), '')
-                                    link_line = next((l for l in ethtool_result.stdout.splitlines() 
-                                                    if 'Link detected:' in l), '')
-                                    
-                                    interfaces_status[iface_name] = {
-                                        'speed': speed_line.split()[-1] if speed_line else 'unknown',
-                                        'link': 'yes' in link_line.lower() if link_line else False,
-                                        'status': 'UP' if 'UP' in line else 'DOWN'
-                                    }
-                                else:
-                                    interfaces_status[iface_name] = {
-                                        'error': f'ethtool failed: {ethtool_result.stderr.strip()}'
-                                    }
-                            except subprocess.TimeoutExpired:
-                                interfaces_status[iface_name] = {'error': 'ethtool timeout'}
-                            except Exception as e:
-                                interfaces_status[iface_name] = {'error': f'ethtool error: {str(e)}'}
+        with os.scandir('/sys/class/net') as it:
+            iface_names = sorted(e.name for e in it if e.name.startswith(('eth', 'ens', 'enp')))
+        
+        for iface_name in iface_names:
+            base = f'/sys/class/net/{iface_name}/'
+            flags = read_sysfs(base + 'flags')
+            up = flags is not None and bool(int(flags, 16) & 0x1)  # IFF_UP
+            if flags is None or not os.path.exists(base + 'speed'):
+                interfaces_status[iface_name] = _ethtool_interface_status(iface_name, up)
+                continue
+            
+            # speed/carrier не читаются (EINVAL) у опущенного интерфейса - как "Unknown!" в ethtool
+            speed = read_sysfs(base + 'speed')
+            interfaces_status[iface_name] = {
+                'speed': f'{speed}Mb/s' if speed and speed != '-1' else 'Unknown!',
+                'link': read_sysfs(base + 'carrier') == '1',
+                'status': 'UP' if up else 'DOWN'
+            }
     except Exception as e:
         interfaces_status['error'] = f'Failed to get interface list: {str(e)}'
     
     return interfaces_status
 
+def find_bmc_user_id(user_list_out: str, user: str) -> Optional[int]:
+    """ID пользователя из вывода `ipmitool user list` по точному совпадению колонки Name.
+
+    Подстрочный поиск давал ложные совпадения (пользователь "adm" находился в строке "admin").
+    """
+    m = re.search(rf'^\s*(\d+)\s+{re.escape(user)}(?:\s|$)', user_list_out, re.MULTILINE)
+    return int(m.group(1)) if m else None
+
 def step_bmc_user(conf):
     """Шаг 3. Создание/проверка учётной записи BMC"""
     print_step("Создание пользователя BMC", "START")
@@ -1934,23 +2795,13 @@ def step_bmc_user(conf):
     pwd  = conf['test_pass']
     
     try:
-        out = run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-                   '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-                   'user', 'list'], log)
-        
-        user_exists = user in out
-        uid = None
+        out = run_ipmi(conf, ['user', 'list'], log)
         
+        # Находим ID существующего пользователя
+        uid = find_bmc_user_id(out, user)
+        user_exists = uid is not None
         if user_exists:
-            # Находим ID существующего пользователя
-            for line in out.splitlines():
-                if user in line and line.strip():
-                    try:
-                        uid = int(line.split()[0])
-                        print(f"[DEBUG] Пользователь {user} уже существует с ID {uid}")
-                        break
-                    except (ValueError, IndexError):
-                        continue
+            logger.debug("Пользователь %s уже существует с ID %s", user, uid)
         
         if not user_exists:
             # Улучшенное определение свободного ID
@@ -1975,12 +2826,12 @@ def step_bmc_user(conf):
                                     empty_indicators = ['', '(Empty', '(empty', '<empty>', 'Empty', 'empty', 'unused', 'Unused']
                                     if name_col and not any(empty_ind in name_col for empty_ind in empty_indicators):
                                         used_ids.append(uid_num)
-                                        print(f"[DEBUG] Слот {uid_num} занят пользователем: '{name_col}'")
+                                        logger.debug("Слот %s занят пользователем: '%s'", uid_num, name_col)
                                     else:
-                                        print(f"[DEBUG] Слот {uid_num} свободен ('{name_col}')")
+                                        logger.debug("Слот %s свободен ('%s')", uid_num, name_col)
                                         
                         except (ValueError, IndexError) as e:
-                            print(f"[DEBUG] Ошибка парсинга строки: '{line}' - {e}")
+                            logger.debug("Ошибка парсинга строки: '%s' - %s", line, e)
                             continue
                 
                 # Найти первый свободный ID начиная с 3 (1-может быть пустой, 2-обычно admin)
@@ -1995,41 +2846,36 @@ def step_bmc_user(conf):
             except Exception as e:
                 raise RuntimeError(f'Ошибка парсинга списка пользователей BMC: {e}')
             
-            print(f"[DEBUG] Создаем пользователя {user} с ID {uid}")
+            logger.debug("Создаем пользователя %s с ID %s", user, uid)
             
             # Создание пользователя
+            # Имя задаётся раньше пароля - порядок команд важен
             cmds = [
-                ['ipmitool','-I','lanplus','-H',conf['bmc_ip'],'-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-                 'user','set','name',str(uid),user],
-                ['ipmitool','-I','lanplus','-H',conf['bmc_ip'],'-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-                 'user','set','password',str(uid),pwd]
+                ['user','set','name',str(uid),user],
+                ['user','set','password',str(uid),pwd]
             ]
             for c in cmds:
-                run(c, log, timeout=60)
+                run_ipmi(conf, c, log)
         
         # Настройка прав пользователя (для существующих и новых пользователей)
         if uid is not None:
-            print(f"[DEBUG] Настраиваем права пользователя {user} (ID {uid})")
+            logger.debug("Настраиваем права пользователя %s (ID %s)", user, uid)
+            # Три независимые команды - одним пакетом (см. run_ipmi_batch)
             privilege_cmds = [
                 # Устанавливаем Administrator privilege
-                ['ipmitool','-I','lanplus','-H',conf['bmc_ip'],'-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-                 'user','priv',str(uid),'4','1'],
+                ['user','priv',str(uid),'4','1'],
                 # Включаем пользователя
-                ['ipmitool','-I','lanplus','-H',conf['bmc_ip'],'-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-                 'user','enable',str(uid)],
+                ['user','enable',str(uid)],
                 # Устанавливаем права доступа к каналу с IPMI messaging
-                ['ipmitool','-I','lanplus','-H',conf['bmc_ip'],'-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-                 'channel','setaccess','1',str(uid),'ipmi=on','privilege=4']
+                ['channel','setaccess','1',str(uid),'ipmi=on','privilege=4']
             ]
-            for c in privilege_cmds:
-                run(c, log, timeout=60)
+            run_ipmi_batch(conf, privilege_cmds, log)
             
             # Проверяем, что права установлены правильно
-            check_result = run(['ipmitool','-I','lanplus','-H',conf['bmc_ip'],'-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-                               'channel','getaccess','1',str(uid)], log, timeout=30)
+            check_result = run_ipmi(conf, ['channel','getaccess','1',str(uid)], log)
             
             if 'ADMINISTRATOR' in check_result and 'enabled' in check_result:
-                print(f"[DEBUG] Права пользователя {user} настроены успешно")
+                logger.debug("Права пользователя %s настроены успешно", user)
             else:
                 print(f"[WARNING] Возможны проблемы с правами пользователя {user}")
                 RESULT_JSON['warnings'].append(f'Права пользователя {user} могут быть настроены неправильно')
@@ -2046,19 +2892,19 @@ def step_bmc_user(conf):
                 if last_line.isdigit():
                     http_code = int(last_line)
                     if http_code == 200:
-                        print(f"[DEBUG] Redfish доступен, HTTP код: {http_code} - SUCCESS")
+                        logger.debug("Redfish доступен, HTTP код: %s - SUCCESS", http_code)
                     elif http_code == 401:
-                        print(f"[DEBUG] Redfish доступен, но авторизация неудачна, HTTP код: {http_code}")
+                        logger.debug("Redfish доступен, но авторизация неудачна, HTTP код: %s", http_code)
                         RESULT_JSON['warnings'].append(f'Redfish авторизация неудачна для пользователя {user}')
                     else:
-                        print(f"[DEBUG] Redfish недоступен, HTTP код: {http_code}")
+                        logger.debug("Redfish недоступен, HTTP код: %s", http_code)
                         RESULT_JSON['warnings'].append(f'Redfish API недоступен, код: {http_code}')
                 else:
-                    print(f"[DEBUG] Redfish проверка завершена")
+                    logger.debug("Redfish проверка завершена")
             
         except Exception as e:
             # Redfish недоступность не критична для тестирования
-            print(f"[DEBUG] Redfish недоступен: {e}")
+            logger.debug("Redfish недоступен: %s", e)
             RESULT_JSON['warnings'].append(f'Redfish API недоступен: {e}')
         
         RESULT_JSON['results']['bmc_user'] = {'status': 'PASS'}
@@ -2080,60 +2926,48 @@ def step_cleanup_bmc_user(conf):
     
     try:
         # Получаем список пользователей
-        out = run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-                   '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-                   'user', 'list'], log)
+        out = run_ipmi(conf, ['user', 'list'], log)
         
-        uid = None
         # Находим ID пользователя
-        for line in out.splitlines():
-            if user in line and line.strip():
-                try:
-                    uid = int(line.split()[0])
-                    print(f"[DEBUG] Найден пользователь {user} с ID {uid} для удаления")
-                    break
-                except (ValueError, IndexError):
-                    continue
+        uid = find_bmc_user_id(out, user)
         
         if uid is not None:
+            logger.debug("Найден пользователь %s с ID %s для удаления", user, uid)
+            
             # Пробуем разные варианты очистки пользователя
             cleanup_success = False
             
             # Вариант 1: Меняем имя на "unused"
             try:
-                run(['ipmitool','-I','lanplus','-H',conf['bmc_ip'],'-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-                     'user','set','name',str(uid),'unused'], log, timeout=30)
+                run_ipmi(conf, ['user','set','name',str(uid),'unused'], log)
                 cleanup_success = True
-                print(f"[DEBUG] Пользователь {user} переименован в 'unused'")
-            except Exception as e:
-                print(f"[DEBUG] Не удалось переименовать в 'unused': {e}, пробуем другие методы")
+                logger.debug("Пользователь %s переименован в 'unused'", user)
+            except RuntimeError as e:
+                logger.debug("Не удалось переименовать в 'unused': %s, пробуем другие методы", e)
             
             # Вариант 2: Отключаем пользователя
             if not cleanup_success:
                 try:
-                    run(['ipmitool','-I','lanplus','-H',conf['bmc_ip'],'-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-                         'user','disable',str(uid)], log, timeout=30)
+                    run_ipmi(conf, ['user','disable',str(uid)], log)
                     cleanup_success = True
-                    print(f"[DEBUG] Пользователь {user} отключен")
-                except Exception as e:
-                    print(f"[DEBUG] Не удалось отключить пользователя: {e}")
+                    logger.debug("Пользователь %s отключен", user)
+                except RuntimeError as e:
+                    logger.debug("Не удалось отключить пользователя: %s", e)
             
             # В любом случае меняем пароль на случайный для безопасности
-            import secrets
             random_password = secrets.token_hex(10)  # 10 hex bytes = 20 символов (предел IPMI)
             try:
-                run(['ipmitool','-I','lanplus','-H',conf['bmc_ip'],'-U',conf['bmc_user'],'-P',conf['bmc_pass'],
-                     'user','set','password',str(uid),random_password], log, timeout=30)
-                print(f"[DEBUG] Пароль пользователя {user} изменен на случайный")
-            except Exception as e:
-                print(f"[DEBUG] Не удалось изменить пароль: {e}")
+                run_ipmi(conf, ['user','set','password',str(uid),random_password], log)
+                logger.debug("Пароль пользователя %s изменен на случайный", user)
+            except RuntimeError as e:
+                logger.debug("Не удалось изменить пароль: %s", e)
             
             if cleanup_success:
                 RESULT_JSON['results']['cleanup_bmc_user'] = {'status': 'PASS', 'details': f'User {user} cleaned up (slot {uid})'}
             else:
                 RESULT_JSON['results']['cleanup_bmc_user'] = {'status': 'WARNING', 'details': f'User {user} partially cleaned (slot {uid})'}
         else:
-            print(f"[DEBUG] Пользователь {user} не найден, очистка не требуется")
+            logger.debug("Пользователь %s не найден, очистка не требуется", user)
             RESULT_JSON['results']['cleanup_bmc_user'] = {'status': 'SKIP', 'details': f'User {user} not found'}
         
         print_step("Удаление тестового пользователя BMC", "PASS")
@@ -2161,7 +2995,7 @@ def step_hw_diff():
     
     try:
         # Путь к эталонной конфигурации
-        baseline_path = REF_ROOT / 'inventory_RSMB-MS93.json'
+        baseline_path = INVENTORY_PATH
         
         if not baseline_path.exists():
             print(f"⚠️  Эталонная конфигурация не найдена: {baseline_path}")
@@ -2196,7 +3030,7 @@ def step_hw_diff():
                 'scan_date': diff_results['scan_info']['current_scan_date']
             }
         }
-        RESULT_JSON['logs']['hw_diff'] = str(diff_report_path)
+        RESULT_JSON['logs']['hw_diff'] = log_path('hw_diff_report.json')
         
         # Логируем основные различия
         for component_name, component_result in diff_results['component_results'].items():
@@ -2217,8 +3051,32 @@ def step_hw_diff():
         }
         print_step("HW-Diff с эталоном", "ERROR")
 
-def enhanced_battery_check(conf):
-    """Улучшенная проверка батареи CR2032 через несколько методов"""
+def _subdir_files(base: str, name: str) -> tuple:
+    """Существующие файлы <base>/<подкаталог>/<name> (обход одного уровня через os.scandir)"""
+    try:
+        with os.scandir(base) as it:
+            candidates = [os.path.join(e.path, name) for e in it if e.is_dir()]
+    except OSError:
+        return ()
+    return tuple(path for path in candidates if os.path.exists(path))
+
+# Источники питания и ACPI батареи не меняются за прогон - список путей строится один раз
+@functools.lru_cache(maxsize=1)
+def _power_supply_voltage_paths() -> tuple:
+    """Атрибуты voltage_now источников питания в /sys/class/power_supply"""
+    return _subdir_files('/sys/class/power_supply', 'voltage_now')
+
+@functools.lru_cache(maxsize=1)
+def _acpi_battery_state_paths() -> tuple:
+    """Файлы state батарей в /proc/acpi/battery"""
+    return _subdir_files('/proc/acpi/battery', 'state')
+
+def enhanced_battery_check(conf, log_file: Path):
+    """Улучшенная проверка батареи CR2032 через несколько методов.
+
+    Сенсор P_VBAT_2600 берётся из общего снимка `sensor list`
+    (get_sensor_snapshot), отдельный `sensor get` к BMC не выполняется.
+    """
     battery_info = {
         'methods_tried': [],
         'status': 'UNKNOWN',
@@ -2228,74 +3086,53 @@ def enhanced_battery_check(conf):
     
     # Метод 1: IPMI сенсор P_VBAT_2600
     try:
-        result = subprocess.run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-                               '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-                               'sensor', 'get', 'P_VBAT_2600'], 
-                              capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0 and 'Sensor Reading' in result.stdout:
-            # Парсим напряжение из вывода
-            for line in result.stdout.splitlines():
-                if 'Sensor Reading' in line:
-                    try:
-                        voltage_str = line.split(':')[1].strip().split()[0]
-                        voltage = float(voltage_str)
-                        battery_info['voltage'] = voltage
-                        battery_info['methods_tried'].append('ipmi_sensor')
-                        battery_info['details']['ipmi_reading'] = line.strip()
-                        
-                        # Оценка состояния батареи
-                        if voltage >= 3.0:
-                            battery_info['status'] = 'PASS'
-                        elif voltage >= 2.5:
-                            battery_info['status'] = 'WARNING'
-                        else:
-                            battery_info['status'] = 'FAIL'
-                        break
-                    except (ValueError, IndexError):
-                        continue
-                        
+        vbat = get_sensor_snapshot(conf, log_file).get('P_VBAT_2600')
+        if vbat is not None and vbat['reading'] is not None:
+            voltage = vbat['reading']
+            battery_info['voltage'] = voltage
+            battery_info['methods_tried'].append('ipmi_sensor')
+            battery_info['details']['ipmi_reading'] = f"{vbat['value']} {vbat['unit']} ({vbat['status']})"
+            
+            # Оценка состояния батареи
+            if voltage >= 3.0:
+                battery_info['status'] = 'PASS'
+            elif voltage >= 2.5:
+                battery_info['status'] = 'WARNING'
+            else:
+                battery_info['status'] = 'FAIL'
+        
         if battery_info['status'] == 'UNKNOWN':
             battery_info['methods_tried'].append('ipmi_sensor_failed')
             
-    except Exception as e:
-        battery_info['methods_tried'].append(f'ipmi_sensor_error: {str(e)}')
+    except RuntimeError as e:
+        battery_info['methods_tried'].append(f'ipmi_sensor_error: {e}')
     
     # Метод 2: Поиск в /sys/class/power_supply
+    # (ошибки доступа к sysfs/procfs обрабатывают read_sysfs и _subdir_files)
     if battery_info['status'] == 'UNKNOWN':
-        try:
-            battery_paths = glob.glob('/sys/class/power_supply/*/voltage_now')
-            for path in battery_paths:
-                try:
-                    with open(path) as f:
-                        voltage_uv = int(f.read().strip())
-                        voltage_v = voltage_uv / 1000000
-                        if 2.5 < voltage_v < 4.0:  # диапазон CR2032
-                            battery_info['voltage'] = voltage_v
-                            battery_info['status'] = 'PASS' if voltage_v >= 3.0 else 'WARNING'
-                            battery_info['methods_tried'].append('sysfs_power_supply')
-                            battery_info['details']['sysfs_path'] = path
-                            break
-                except (ValueError, IOError):
-                    continue
-                    
-            if battery_info['status'] == 'UNKNOWN':
-                battery_info['methods_tried'].append('sysfs_power_supply_empty')
-                
-        except Exception as e:
-            battery_info['methods_tried'].append(f'sysfs_error: {str(e)}')
+        for path in _power_supply_voltage_paths():
+            try:
+                voltage_uv = int(read_sysfs(path) or '')
+            except ValueError:
+                continue
+            voltage_v = voltage_uv / 1000000
+            if 2.5 < voltage_v < 4.0:  # диапазон CR2032
+                battery_info['voltage'] = voltage_v
+                battery_info['status'] = 'PASS' if voltage_v >= 3.0 else 'WARNING'
+                battery_info['methods_tried'].append('sysfs_power_supply')
+                battery_info['details']['sysfs_path'] = path
+                break
+        
+        if battery_info['status'] == 'UNKNOWN':
+            battery_info['methods_tried'].append('sysfs_power_supply_empty')
     
     # Метод 3: ACPI через /proc/acpi
     if battery_info['status'] == 'UNKNOWN':
-        try:
-            acpi_paths = glob.glob('/proc/acpi/battery/*/state')
-            if acpi_paths:
-                battery_info['methods_tried'].append('acpi_found')
-                # Здесь можно добавить парсинг ACPI данных
-            else:
-                battery_info['methods_tried'].append('acpi_not_found')
-        except Exception as e:
-            battery_info['methods_tried'].append(f'acpi_error: {str(e)}')
+        if _acpi_battery_state_paths():
+            battery_info['methods_tried'].append('acpi_found')
+            # Здесь можно добавить парсинг ACPI данных
+        else:
+            battery_info['methods_tried'].append('acpi_not_found')
     
     # Если ничего не найдено, но IPMI сенсор работал
     if battery_info['status'] == 'UNKNOWN' and 'ipmi_sensor' in battery_info['methods_tried']:
@@ -2304,8 +3141,51 @@ def enhanced_battery_check(conf):
     
     return battery_info
 
+def list_ip_links() -> List[Dict[str, str]]:
+    """Интерфейсы из `ip link show`: имя, строка флагов/состояния, MAC.
+
+    Используется JSON вывод `ip -j` (iproute2 >= 4.13); на старом iproute2 -
+    разбор текстового вывода.
+    """
+    try:
+        result = subprocess.run(['ip', '-j', 'link', 'show'], capture_output=True, timeout=30)
+        if result.returncode == 0:
+            links = orjson.loads(result.stdout) if ORJSON_AVAILABLE else json.loads(result.stdout)
+            return [{
+                'name': link['ifname'],
+                'flags': f"<{','.join(link.get('flags', []))}> state {link.get('operstate', 'UNKNOWN')}",
+                'mac_address': link.get('address', 'unknown') if link.get('link_type') == 'ether' else 'unknown',
+            } for link in links]
+    except (ValueError, KeyError, TypeError):
+        pass
+    
+    links = []
+    result = subprocess.run(['ip', 'link', 'show'], capture_output=True, text=True, timeout=30)
+    if result.returncode != 0:
+        return links
+    for line in result.stdout.splitlines():
+        m = _IP_LINK_IFACE_RE.match(line)
+        if m:
+            # Основная строка интерфейса
+            links.append({'name': m.group(1), 'flags': line, 'mac_address': 'unknown'})
+        elif links:
+            # Строка с MAC адресом
+            m = _IP_LINK_MAC_RE.match(line)
+            if m:
+                links[-1]['mac_address'] = m.group(1)
+    return links
+
 def analyze_network_connectivity():
-    """Детальный анализ состояния сетевых подключений"""
+    """Детальный анализ состояния сетевых подключений.
+
+    Опрос интерфейсов выполняется один раз на прогон; каждый вызов получает
+    свою копию результата, которую можно дополнять в отчёте.
+    """
+    return copy.deepcopy(_analyze_network_connectivity())
+
+@functools.lru_cache(maxsize=1)
+def _analyze_network_connectivity():
+    """Опрос сетевых интерфейсов для analyze_network_connectivity (кэшируется, не изменять)"""
     connectivity_info = {
         'interfaces': {},
         'summary': {},
@@ -2314,73 +3194,62 @@ def analyze_network_connectivity():
     
     try:
         # Получаем список всех интерфейсов
-        result = subprocess.run(['ip', 'link', 'show'], capture_output=True, text=True, timeout=30)
-        if result.returncode == 0:
-            current_interface = None
-            
-            for line in result.stdout.splitlines():
-                if ': ' in line and not line.startswith(' '):
-                    # Основная строка интерфейса
-                    parts = line.split(': ')
-                    if len(parts) >= 2:
-                        iface_name = parts[1].split('@')[0]
-                        if iface_name.startswith(('eth', 'ens', 'enp')):
-                            current_interface = iface_name
-                            connectivity_info['interfaces'][iface_name] = {
-                                'name': iface_name,
-                                'status': 'UP' if 'UP' in line else 'DOWN',
-                                'flags': line,
-                                'link_status': 'unknown',
-                                'speed': 'unknown',
-                                'duplex': 'unknown',
-                                'mac_address': 'unknown'
-                            }
-                elif current_interface and 'link/ether' in line:
-                    # Строка с MAC адресом
-                    parts = line.strip().split()
-                    if len(parts) >= 2:
-                        connectivity_info['interfaces'][current_interface]['mac_address'] = parts[1]
-            
-            # Детальная проверка каждого интерфейса через ethtool
-            for iface_name in connectivity_info['interfaces']:
-                try:
+        for iface in list_ip_links():
+            iface_name = iface['name']
+            if iface_name.startswith(('eth', 'ens', 'enp')):
+                connectivity_info['interfaces'][iface_name] = {
+                    'name': iface_name,
+                    'status': 'UP' if 'UP' in iface['flags'] else 'DOWN',
+                    'flags': iface['flags'],
+                    'link_status': 'unknown',
+                    'speed': 'unknown',
+                    'duplex': 'unknown',
+                    'mac_address': iface['mac_address']
+                }
+        
+        # Детальная проверка каждого интерфейса: sysfs, ethtool - только без атрибутов в sysfs
+        for iface_name in connectivity_info['interfaces']:
+            try:
+                link_fields = _sysfs_link_fields(iface_name)
+                if link_fields is None:
                     ethtool_result = subprocess.run(['ethtool', iface_name], 
                                                   capture_output=True, text=True, timeout=10)
                     if ethtool_result.returncode == 0:
-                        ethtool_output = ethtool_result.stdout
-                        
-                        # Парсим ethtool данные
-                        for line in ethtool_output.splitlines():
-                            line = line.strip()
-                            if 'Speed:' in line:
-                                connectivity_info['interfaces'][iface_name]['speed'] = line.split(':', 1)[1].strip()
-                            elif 'Duplex:' in line:
-                                connectivity_info['interfaces'][iface_name]['duplex'] = line.split(':', 1)[1].strip()
-                            elif 'Link detected:' in line:
-                                link_status = line.split(':', 1)[1].strip()
-                                connectivity_info['interfaces'][iface_name]['link_status'] = link_status
-                                
-                                # Специальная обработка для разных типов "no link"
-                                if 'no' in link_status.lower():
-                                    if 'cable' in link_status.lower():
-                                        connectivity_info['interfaces'][iface_name]['link_reason'] = 'no_cable'
-                                    else:
-                                        connectivity_info['interfaces'][iface_name]['link_reason'] = 'no_link'
+                        link_fields = _ETHTOOL_KV_RE.findall(ethtool_result.stdout)
+                
+                if link_fields:
+                    # Парсим данные линка (поля в формате ethtool)
+                    for key, value in link_fields:
+                        if key == 'Speed':
+                            connectivity_info['interfaces'][iface_name]['speed'] = value
+                        elif key == 'Duplex':
+                            connectivity_info['interfaces'][iface_name]['duplex'] = value
+                        else:
+                            link_status = value
+                            connectivity_info['interfaces'][iface_name]['link_status'] = link_status
+                            
+                            # Специальная обработка для разных типов "no link"
+                            if 'no' in link_status.lower():
+                                if 'cable' in link_status.lower():
+                                    connectivity_info['interfaces'][iface_name]['link_reason'] = 'no_cable'
                                 else:
-                                    connectivity_info['interfaces'][iface_name]['link_reason'] = 'link_up'
-                                    
-                except subprocess.TimeoutExpired:
-                    connectivity_info['interfaces'][iface_name]['ethtool_error'] = 'timeout'
-                except Exception as e:
-                    connectivity_info['interfaces'][iface_name]['ethtool_error'] = str(e)
+                                    connectivity_info['interfaces'][iface_name]['link_reason'] = 'no_link'
+                            else:
+                                connectivity_info['interfaces'][iface_name]['link_reason'] = 'link_up'
+                                
+            except subprocess.TimeoutExpired:
+                connectivity_info['interfaces'][iface_name]['ethtool_error'] = 'timeout'
+            except OSError as e:
+                connectivity_info['interfaces'][iface_name]['ethtool_error'] = f'{type(e).__name__}: {e.strerror}'
         
         # Создаем сводку
         total_interfaces = len(connectivity_info['interfaces'])
-        interfaces_up = sum(1 for iface in connectivity_info['interfaces'].values() if iface['status'] == 'UP')
-        interfaces_with_link = sum(1 for iface in connectivity_info['interfaces'].values() 
-                                 if iface.get('link_reason') == 'link_up')
-        interfaces_no_cable = sum(1 for iface in connectivity_info['interfaces'].values() 
-                                if iface.get('link_reason') == 'no_cable')
+        interfaces_up = interfaces_with_link = interfaces_no_cable = 0
+        for iface in connectivity_info['interfaces'].values():
+            interfaces_up += iface['status'] == 'UP'
+            link_reason = iface.get('link_reason')
+            interfaces_with_link += link_reason == 'link_up'
+            interfaces_no_cable += link_reason == 'no_cable'
         
         connectivity_info['summary'] = {
             'total_interfaces': total_interfaces,
@@ -2410,6 +3279,50 @@ def analyze_network_connectivity():
     
     return connectivity_info
 
+# Категория устройства по шине PCI ("xx:"), проверяемая до правил по классу:
+# CPU-интегрированные устройства на высоких шинах 7e:, 7f:, fe:, ff:,
+# chipset - встроенные контроллеры на шине 00:
+_PCI_PREFIX_CATEGORY = {
+    '7e:': 'cpu_integrated', '7f:': 'cpu_integrated', 'fe:': 'cpu_integrated', 'ff:': 'cpu_integrated',
+    '00:': 'chipset_devices',
+}
+# Сетевые карты расширения: Intel X710 (шина 52:), Mellanox ConnectX-5 (шина e4:);
+# остальные сетевые, например Intel i350 на шине 01:, - встроенные
+_PCI_NET_EXPANSION_PREFIXES = frozenset({'52:', 'e4:'})
+# Прочие устройства на этих шинах - скорее всего CPU-интегрированные
+_PCI_CPU_BUS_PREFIXES = frozenset({
+    '15:', '29:', '3d:', '51:', '65:', '79:', '80:', '97:', 'aa:', 'bd:', 'd0:', 'e3:', 'f6:',
+})
+
+def _pci_device_category(prefix: str, device_class: str, description: str) -> str:
+    """Категория PCI устройства по шине ("xx:"), классу и описанию (lowercase)"""
+    category = _PCI_PREFIX_CATEGORY.get(prefix)
+    if category is not None:
+        return category
+    
+    # Сетевые карты - проверяем конкретные шины
+    if device_class == 'network' and 'ethernet' in description:
+        return 'expansion_cards' if prefix in _PCI_NET_EXPANSION_PREFIXES else 'onboard_devices'
+    
+    # Устройства хранения: NVMe на отдельной шине d4: - карта расширения,
+    # SATA контроллеры - встроенные
+    if device_class == 'storage' or 'nvme' in description or 'sata' in description:
+        return 'expansion_cards' if prefix == 'd4:' else 'chipset_devices'
+    
+    # VGA и display устройства (ASPEED VGA) - встроенные
+    if device_class == 'display':
+        return 'onboard_devices'
+    
+    # Мосты PCI
+    if device_class == 'bridge':
+        return 'chipset_devices'
+    
+    if prefix in _PCI_CPU_BUS_PREFIXES:
+        return 'cpu_integrated'
+    
+    # Все остальные - встроенные
+    return 'onboard_devices'
+
 def classify_pci_devices_enhanced(pci_devices):
     """Улучшенная классификация PCI устройств на встроенные vs внешние"""
     classification = {
@@ -2423,80 +3336,15 @@ def classify_pci_devices_enhanced(pci_devices):
     for device in pci_devices:
         bus_info = device.get('bus_info', '')
         description = device.get('description', '').lower()
-        vendor = device.get('vendor', '').lower()
         device_class = device.get('class', 'unknown')
         
-        # Извлекаем PCI адрес для анализа
-        pci_address = bus_info.replace('pci@', '') if bus_info.startswith('pci@') else bus_info
+        # Шина PCI ("xx:") для анализа - вычисляется один раз на устройство
+        bus_prefix = bus_info[4:7] if bus_info.startswith('pci@') else bus_info[:3]
         
         # Классификация по PCI адресу и типу устройства
-        device_category = 'unknown'
-        
-        # CPU интегрированные устройства (обычно на высоких шинах 7e:, 7f:, fe:, ff:)
-        if any(pci_address.startswith(prefix) for prefix in ['7e:', '7f:', 'fe:', 'ff:']):
-            device_category = 'cpu_integrated'
-            classification['cpu_integrated'].append(device)
-            
-        # Chipset устройства (обычно на шине 00: - встроенные контроллеры)
-        elif pci_address.startswith('00:'):
-            device_category = 'chipset_devices'
-            classification['chipset_devices'].append(device)
-                
-        # Сетевые карты - проверяем конкретные шины
-        elif device_class == 'network' and 'ethernet' in description:
-            # Intel i350 (встроенная) - шина 01:
-            if pci_address.startswith('01:'):
-                device_category = 'onboard_devices'
-                classification['onboard_devices'].append(device)
-            # Intel X710 (карта расширения) - шина 52:
-            elif pci_address.startswith('52:'):
-                device_category = 'expansion_cards'
-                classification['expansion_cards'].append(device)
-            # Mellanox ConnectX-5 (карта расширения) - шина e4:
-            elif pci_address.startswith('e4:'):
-                device_category = 'expansion_cards'
-                classification['expansion_cards'].append(device)
-            else:
-                device_category = 'onboard_devices'
-                classification['onboard_devices'].append(device)
-                
-        # Устройства хранения
-        elif device_class == 'storage' or 'nvme' in description or 'sata' in description:
-            # NVMe на отдельной шине - карта расширения
-            if pci_address.startswith('d4:'):
-                device_category = 'expansion_cards'
-                classification['expansion_cards'].append(device)
-            # SATA контроллеры на шине 00: - встроенные
-            else:
-                device_category = 'chipset_devices'
-                classification['chipset_devices'].append(device)
-                
-        # VGA и display устройства
-        elif device_class == 'display':
-            # ASPEED VGA на отдельной шине 03: - встроенная
-            if pci_address.startswith('03:'):
-                device_category = 'onboard_devices'
-                classification['onboard_devices'].append(device)
-            else:
-                device_category = 'onboard_devices'
-                classification['onboard_devices'].append(device)
-                
-        # Мосты PCI
-        elif device_class == 'bridge':
-            device_category = 'chipset_devices'
-            classification['chipset_devices'].append(device)
-                
-        # Все остальные устройства на высоких шинах - скорее всего CPU-интегрированные
-        elif any(pci_address.startswith(prefix) for prefix in 
-                ['15:', '29:', '3d:', '51:', '65:', '79:', '80:', '97:', 'aa:', 'bd:', 'd0:', 'e3:', 'f6:']):
-            device_category = 'cpu_integrated'
-            classification['cpu_integrated'].append(device)
-            
-        # Все остальные - встроенные
-        else:
-            device_category = 'onboard_devices'
-            classification['onboard_devices'].append(device)
+        device_category = _pci_device_category(bus_prefix, device_class, description)
         
+        classification[device_category].append(device)
         # Добавляем категорию к устройству
         device['category'] = device_category
     
@@ -2510,31 +3358,32 @@ def classify_pci_devices_enhanced(pci_devices):
     }
     
     # Анализ по типам карт расширения
-    expansion_by_type = {}
+    expansion_by_type = defaultdict(list)
     for device in classification['expansion_cards']:
-        device_type = device.get('class', 'unknown')
-        if device_type not in expansion_by_type:
-            expansion_by_type[device_type] = []
-        expansion_by_type[device_type].append(device)
+        expansion_by_type[device.get('class', 'unknown')].append(device)
     
-    classification['expansion_by_type'] = expansion_by_type
+    classification['expansion_by_type'] = dict(expansion_by_type)
     
     return classification
 
-def print_final_summary():
-    """Вывод итоговой сводки результатов тестирования"""
+def print_final_summary(report: Dict[str, Any]):
+    """Вывод итоговой сводки результатов тестирования по отчёту (RESULT_JSON или его копия)"""
     print("\n" + "="*80)
     print("📊 ИТОГОВАЯ СВОДКА ТЕСТИРОВАНИЯ STAGE-2")
     print("="*80)
     
-    # Подсчет статусов
-    pass_count = sum(1 for r in RESULT_JSON['results'].values() if r.get('status') == 'PASS')
-    fail_count = sum(1 for r in RESULT_JSON['results'].values() if r.get('status') == 'FAIL')
-    warning_count = sum(1 for r in RESULT_JSON['results'].values() if r.get('status') == 'WARNING')
-    skip_count = sum(1 for r in RESULT_JSON['results'].values() if r.get('status') == 'SKIP')
-    error_count = sum(1 for r in RESULT_JSON['results'].values() if r.get('status') == 'ERROR')
+    # Группировка тестов по статусу одним проходом
+    by_status = defaultdict(list)
+    for test_name, result in report['results'].items():
+        by_status[result.get('status')].append((test_name, result))
+    
+    pass_count = len(by_status['PASS'])
+    fail_count = len(by_status['FAIL'])
+    warning_count = len(by_status['WARNING'])
+    skip_count = len(by_status['SKIP'])
+    error_count = len(by_status['ERROR'])
     
-    total_tests = len(RESULT_JSON['results'])
+    total_tests = len(report['results'])
     
     # Определение общего статуса
     if fail_count > 0 or error_count > 0:
@@ -2548,8 +3397,8 @@ def print_final_summary():
         status_symbol = "✅"
     
     print(f"\n{status_symbol} ОБЩИЙ СТАТУС: {overall_status}")
-    print(f"\nСерийный номер: {RESULT_JSON['serial']}")
-    print(f"Время выполнения: {RESULT_JSON.get('duration_sec', 0)} сек")
+    print(f"\nСерийный номер: {report['serial']}")
+    print(f"Время выполнения: {report.get('duration_sec', 0)} сек")
     print(f"\nРезультаты тестов ({total_tests} тестов):")
     print(f"  ✅ PASS:    {pass_count}")
     print(f"  ❌ FAIL:    {fail_count}")
@@ -2560,38 +3409,110 @@ def print_final_summary():
     # Детали критических проблем
     if fail_count > 0:
         print("\n❌ КРИТИЧЕСКИЕ ПРОБЛЕМЫ:")
-        for test_name, result in RESULT_JSON['results'].items():
-            if result.get('status') == 'FAIL':
-                print(f"  • {test_name}: {result.get('details', 'Тест не пройден')}")
-                # Особая обработка для сенсоров
-                if test_name == 'sensor_readings' and isinstance(result.get('details'), dict):
-                    details = result['details']
-                    if 'category_summary' in details:
-                        for category, cat_data in details['category_summary'].items():
-                            if cat_data.get('status') == 'FAIL':
-                                print(f"    - {category}: {cat_data.get('failed', 0)} сенсоров с нарушениями")
+        for test_name, result in by_status['FAIL']:
+            print(f"  • {test_name}: {result.get('details', 'Тест не пройден')}")
+            # Особая обработка для сенсоров
+            if test_name == 'sensor_readings' and isinstance(result.get('details'), dict):
+                details = result['details']
+                if 'category_summary' in details:
+                    for category, cat_data in details['category_summary'].items():
+                        if cat_data.get('status') == 'FAIL':
+                            print(f"    - {category}: {cat_data.get('failed', 0)} сенсоров с нарушениями")
     
     # Детали предупреждений
     if warning_count > 0:
         print("\n⚠️  ПРЕДУПРЕЖДЕНИЯ:")
-        for test_name, result in RESULT_JSON['results'].items():
-            if result.get('status') == 'WARNING':
-                print(f"  • {test_name}: {result.get('details', 'Есть замечания')}")
+        for test_name, result in by_status['WARNING']:
+            print(f"  • {test_name}: {result.get('details', 'Есть замечания')}")
     
     # Пропущенные тесты
     if skip_count > 0:
         print("\n⏭️  ПРОПУЩЕННЫЕ ТЕСТЫ:")
-        for test_name, result in RESULT_JSON['results'].items():
-            if result.get('status') == 'SKIP':
-                details = result.get('details', {})
-                if isinstance(details, dict):
-                    message = details.get('message', 'Тест пропущен')
-                else:
-                    message = str(details)
-                print(f"  • {test_name}: {message}")
+        for test_name, result in by_status['SKIP']:
+            details = result.get('details', {})
+            if isinstance(details, dict):
+                message = details.get('message', 'Тест пропущен')
+            else:
+                message = str(details)
+            print(f"  • {test_name}: {message}")
     
     print("\n" + "="*80)
 
+# Значения FRU полей, равнозначные отсутствию данных
+_FRU_EMPTY_VALUES = frozenset({'', 'N/A', 'Not Available'})
+
+# Слоты райзеров: (фрагмент Product Name, фрагмент Part Number, слот)
+_RISER_SLOT_MAP = (
+    ('RISER-1', '1A00-11', 'RISER_SLOT_1'),
+    ('RISER-2', '1A00-22', 'RISER_SLOT_2'),
+    ('RISER-3', '1A00-33', 'RISER_SLOT_3'),
+)
+
+# Параллельных процессов ipmitool к одному BMC (больше BMC обычно не обслуживает)
+_IPMI_MAX_PARALLEL = 4
+
+def fetch_fru_records(conf, fru_ids: Iterable[int], log_file: Path) -> Dict[int, Any]:
+    """Вывод `fru print <id>` для каждого FRU ID; при ошибке значение - исключение.
+
+    При открытой сессии команды идут через неё подряд. Без сессии процессы
+    ipmitool запускаются параллельно (не больше _IPMI_MAX_PARALLEL), вывод
+    пишется в лог в порядке FRU ID.
+    """
+    records = {}
+    if IPMI_SESSION is not None and IPMI_SESSION.alive:
+        for fru_id in fru_ids:
+            try:
+                records[fru_id] = run_ipmi(conf, ['fru', 'print', str(fru_id)], log_file, accept_rc=[0, 1])
+            except RuntimeError as e:
+                records[fru_id] = e
+        return records
+    
+    bmc = IPMI_SESSION.bmc if IPMI_SESSION is not None else BmcConf.from_conf(conf)
+    fru_ids = list(fru_ids)
+    with ThreadPoolExecutor(max_workers=max(1, min(_IPMI_MAX_PARALLEL, len(fru_ids)))) as ex:
+        futures = {fru_id: ex.submit(_ipmi_process, [*bmc.ipmi_prefix, 'fru', 'print', str(fru_id)],
+                                     ipmi_timeout(['fru']))
+                   for fru_id in fru_ids}
+    
+    with open(log_file, 'a', encoding='utf-8') as f:
+        for fru_id, future in futures.items():
+            f.write(f">>> {mask_cmd([*bmc.ipmi_prefix, 'fru', 'print', str(fru_id)])}\n")
+            try:
+                proc = future.result()
+            except (subprocess.TimeoutExpired, OSError) as e:
+                f.write(f"ERROR: {e}\n")
+                records[fru_id] = e
+                continue
+            out = proc.stdout.decode('utf-8', errors='replace')
+            f.write(out + '\n')
+            if proc.returncode in (0, 1):
+                records[fru_id] = out.strip()
+            else:
+                records[fru_id] = RuntimeError(f"fru print {fru_id} exit {proc.returncode}, see {log_file}")
+    return records
+
+# Строка поля продукта в `fru print`: (поле, значение)
+_FRU_PRODUCT_RE = re.compile(
+    r'^[^:\n]*(Product (?:Name|Manufacturer|Part Number|Serial))[^:\n]*:[ \t]*(.*?)[ \t]*\r?$',
+    re.MULTILINE
+)
+_FRU_PRODUCT_FIELDS = {
+    'Product Name': 'product_name',
+    'Product Manufacturer': 'manufacturer',
+    'Product Part Number': 'part_number',
+    'Product Serial': 'serial_number',
+}
+
+def parse_fru_block(fru_out: str) -> Dict[str, str]:
+    """Поля продукта (имя, производитель, part/serial number) из вывода `fru print`"""
+    fru_data = {}
+    # finditer ленивый: разбор прекращается, как только найдены все поля продукта
+    for m in _FRU_PRODUCT_RE.finditer(fru_out):
+        fru_data.setdefault(_FRU_PRODUCT_FIELDS[m.group(1)], m.group(2))
+        if len(fru_data) == len(_FRU_PRODUCT_FIELDS):
+            break
+    return fru_data
+
 def step_riser_check(conf):
     """Шаг 4.2.6.3.6. Проверка райзеров согласно TRD"""
     print_step("Проверка райзеров (FRU)", "START")
@@ -2605,111 +3526,93 @@ def step_riser_check(conf):
             'status': 'PASS'
         }
         
-        # Сканируем FRU записи в поисках райзеров
-        with log.open('w') as f:
-            f.write('=== RISER CARD FRU VALIDATION ===\n\n')
-            
-            for fru_id in range(1, 10):  # FRU ID 1-9 для периферийных устройств
-                try:
-                    fru_out = run(['ipmitool', '-I', 'lanplus', '-H', conf['bmc_ip'],
-                                  '-U', conf['bmc_user'], '-P', conf['bmc_pass'],
-                                  'fru', 'print', str(fru_id)], log, timeout=30, accept_rc=[0, 1])
+        # Сканируем FRU записи в поисках райзеров: FRU ID 1-9 для периферийных устройств
+        fru_records = fetch_fru_records(conf, range(1, 10), log)
+        
+        # Отчёт копится в памяти и пишется в лог одним вызовом
+        report = ['\n=== RISER CARD FRU VALIDATION ===\n\n']
+        
+        for fru_id, fru_out in fru_records.items():
+            try:
+                if isinstance(fru_out, Exception):
+                    raise fru_out
+                
+                if 'Product Name' in fru_out and fru_out.strip():
+                    report.append(f'\n--- FRU ID {fru_id} ---\n{fru_out}')
+                    
+                    fru_data = parse_fru_block(fru_out)
                     
-                    if 'Product Name' in fru_out and fru_out.strip():
-                        f.write(f'\n--- FRU ID {fru_id} ---\n')
-                        f.write(fru_out)
+                    # Проверяем, является ли это райзером
+                    product_name = fru_data.get('product_name', '').upper()
+                    if ('RISER' in product_name or 
+                        'RSMB-MS93' in product_name or
+                        'RISER' in fru_data.get('part_number', '').upper()):
                         
-                        fru_data = {}
-                        for line in fru_out.splitlines():
-                            if ':' in line:
-                                key, value = line.split(':', 1)
-                                key = key.strip()
-                                value = value.strip()
-                                
-                                if 'Product Name' in key:
-                                    fru_data['product_name'] = value
-                                elif 'Product Manufacturer' in key:
-                                    fru_data['manufacturer'] = value
-                                elif 'Product Part Number' in key:
-                                    fru_data['part_number'] = value
-                                elif 'Product Serial' in key:
-                                    fru_data['serial_number'] = value
+                        # Определяем слот райзера
+                        part_number = fru_data.get('part_number', '')
+                        slot = next((slot_id for name_kw, pn_kw, slot_id in _RISER_SLOT_MAP
+                                     if name_kw in product_name or pn_kw in part_number),
+                                    f'RISER_SLOT_{fru_id}')
                         
-                        # Проверяем, является ли это райзером
-                        product_name = fru_data.get('product_name', '').upper()
-                        if ('RISER' in product_name or 
-                            'RSMB-MS93' in product_name or
-                            'RISER' in fru_data.get('part_number', '').upper()):
-                            
-                            # Определяем слот райзера
-                            if 'RISER-1' in product_name or '1A00-11' in fru_data.get('part_number', ''):
-                                slot = 'RISER_SLOT_1'
-                            elif 'RISER-2' in product_name or '1A00-22' in fru_data.get('part_number', ''):
-                                slot = 'RISER_SLOT_2'
-                            elif 'RISER-3' in product_name or '1A00-33' in fru_data.get('part_number', ''):
-                                slot = 'RISER_SLOT_3'
-                            else:
-                                slot = f'RISER_SLOT_{fru_id}'
-                            
-                            riser_info = {
-                                'fru_id': fru_id,
-                                'slot': slot,
-                                'populated': True,
-                                **fru_data
+                        riser_info = {
+                            'fru_id': fru_id,
+                            'slot': slot,
+                            'populated': True,
+                            **fru_data
+                        }
+                        
+                        results['detected_risers'].append(riser_info)
+                        results['total_risers_found'] += 1
+                        
+                        # Валидация FRU данных
+                        validation = {}
+                        
+                        # Проверка обязательных полей
+                        required_fields = ['product_name', 'manufacturer', 'part_number', 'serial_number']
+                        for field in required_fields:
+                            if not fru_data.get(field) or fru_data.get(field) in _FRU_EMPTY_VALUES:
+                                validation[f'{field}_missing'] = True
+                                results['status'] = 'FAIL'
+                        
+                        # Проверка соответствия производителя
+                        expected_manufacturer = 'GIGA-BYTE TECHNOLOGY CO., LTD'
+                        if fru_data.get('manufacturer', '') != expected_manufacturer:
+                            validation['manufacturer_mismatch'] = {
+                                'expected': expected_manufacturer,
+                                'actual': fru_data.get('manufacturer', '')
                             }
-                            
-                            results['detected_risers'].append(riser_info)
-                            results['total_risers_found'] += 1
-                            
-                            # Валидация FRU данных
-                            validation = {}
-                            
-                            # Проверка обязательных полей
-                            required_fields = ['product_name', 'manufacturer', 'part_number', 'serial_number']
-                            for field in required_fields:
-                                if not fru_data.get(field) or fru_data.get(field) in ['', 'N/A', 'Not Available']:
-                                    validation[f'{field}_missing'] = True
-                                    results['status'] = 'FAIL'
-                            
-                            # Проверка соответствия производителя
-                            expected_manufacturer = 'GIGA-BYTE TECHNOLOGY CO., LTD'
-                            if fru_data.get('manufacturer', '') != expected_manufacturer:
-                                validation['manufacturer_mismatch'] = {
-                                    'expected': expected_manufacturer,
-                                    'actual': fru_data.get('manufacturer', '')
-                                }
-                                results['status'] = 'WARNING'
-                            
-                            # Проверка формата part number
-                            part_number = fru_data.get('part_number', '')
-                            if not part_number.startswith('25VH1-1A00-'):
-                                validation['part_number_format_error'] = {
-                                    'expected_prefix': '25VH1-1A00-',
-                                    'actual': part_number
-                                }
-                                results['status'] = 'WARNING'
-                            
-                            results['fru_validation'][slot] = validation
-                            
-                            f.write(f'\n>>> DETECTED RISER: {slot}\n')
-                            f.write(f'Product: {fru_data.get("product_name", "N/A")}\n')
-                            f.write(f'Manufacturer: {fru_data.get("manufacturer", "N/A")}\n')
-                            f.write(f'Part Number: {fru_data.get("part_number", "N/A")}\n')
-                            f.write(f'Serial: {fru_data.get("serial_number", "N/A")}\n')
-                            
-                            if validation:
-                                f.write(f'Validation Issues: {validation}\n')
+                            results['status'] = 'WARNING'
                         
-                except subprocess.TimeoutExpired:
-                    f.write(f'FRU ID {fru_id}: Timeout\n')
-                    continue
-                except Exception as e:
-                    f.write(f'FRU ID {fru_id}: Error - {str(e)}\n')
-                    continue
-            
-            f.write(f'\n=== SUMMARY ===\n')
-            f.write(f'Total risers detected: {results["total_risers_found"]}\n')
-            f.write(f'Overall status: {results["status"]}\n')
+                        # Проверка формата part number
+                        if not part_number.startswith('25VH1-1A00-'):
+                            validation['part_number_format_error'] = {
+                                'expected_prefix': '25VH1-1A00-',
+                                'actual': part_number
+                            }
+                            results['status'] = 'WARNING'
+                        
+                        results['fru_validation'][slot] = validation
+                        
+                        # Блок райзера - один фрагмент отчёта
+                        report.append(f'\n>>> DETECTED RISER: {slot}\n'
+                                      f'Product: {fru_data.get("product_name", "N/A")}\n'
+                                      f'Manufacturer: {fru_data.get("manufacturer", "N/A")}\n'
+                                      f'Part Number: {fru_data.get("part_number", "N/A")}\n'
+                                      f'Serial: {fru_data.get("serial_number", "N/A")}\n'
+                                      + (f'Validation Issues: {validation}\n' if validation else ''))
+                    
+            except subprocess.TimeoutExpired:
+                report.append(f'FRU ID {fru_id}: Timeout\n')
+                continue
+            except Exception as e:
+                report.append(f'FRU ID {fru_id}: Error - {str(e)}\n')
+                continue
+        
+        report.append(f'\n=== SUMMARY ===\n'
+                      f'Total risers detected: {results["total_risers_found"]}\n'
+                      f'Overall status: {results["status"]}\n')
+        with log.open('a') as f:
+            f.write(''.join(report))
         
         # Проверка минимальных требований
         if results['total_risers_found'] == 0:
@@ -2719,7 +3622,7 @@ def step_riser_check(conf):
             results['message'] = f'All {results["total_risers_found"]} riser cards validated successfully'
         
         RESULT_JSON['results']['riser_check'] = {'status': results['status'], 'details': results}
-        RESULT_JSON['logs']['riser_check'] = str(log)
+        RESULT_JSON['logs']['riser_check'] = log_path('riser_check.log')
         print_step("Проверка райзеров (FRU)", results['status'])
         
     except Exception as e:
@@ -2732,15 +3635,54 @@ def step_riser_check(conf):
 
 # ---------- main -----------------------------------------------------------
 
+def run_concurrently(calls: List[tuple]) -> List[Any]:
+    """Параллельный запуск независимых вызовов (функция, *аргументы), результаты по порядку.
+
+    Исключение шага пробрасывается после завершения остальных. При срабатывании
+    watchdog (RunTimeout) зависшие шаги не ожидаются: ещё не начатые отменяются.
+    Консольный вывод каждого вызова собирается StepConsole и выводится блоком.
+    """
+    console = StepConsole(sys.stdout)
+    sys.stdout = console
+    ex = ThreadPoolExecutor(max_workers=len(calls))
+    try:
+        futures = [ex.submit(console.run, fn, *args) for fn, *args in calls]
+        wait(futures)
+    except RunTimeout:
+        ex.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        sys.stdout = console.stream
+    ex.shutdown()
+    return [future.result() for future in futures]
+
+def prettify_reports(paths: List[str]) -> None:
+    """Переформатирование компактных JSON отчётов с отступом 2 (на месте)"""
+    for name in paths:
+        path = Path(name)
+        dump_json(load_json(path), path, pretty=True)
+        print(f'✓ {path}')
+
 def main():
-    global LOG_ROOT
+    global LOG_ROOT, IPMI_SESSION
+    
+    # Постобработка готовых отчётов: stage2.py --pretty report_stage2.json [...]
+    if sys.argv[1:2] == ['--pretty']:
+        if len(sys.argv) < 3:
+            print(f'Использование: {sys.argv[0]} --pretty report_stage2.json [...]', file=sys.stderr)
+            sys.exit(2)
+        prettify_reports(sys.argv[2:])
+        return
+    
+    logging.basicConfig(level=logging.DEBUG if os.environ.get('STAGE2_DEBUG') else logging.INFO,
+                        format='[%(levelname)s] %(message)s')
     
     # Проверка зависимостей в начале работы
-    try:
-        check_dependencies()
-    except RuntimeError as e:
-        print(f'ОШИБКА: {e}', file=sys.stderr)
+    missing = check_dependencies()
+    if missing:
+        print(f"ОШИБКА: Отсутствуют инструменты: {', '.join(missing)}", file=sys.stderr)
         sys.exit(1)
+    print("✓ Все необходимые инструменты найдены")
     
     # Проверка прав доступа
     if os.geteuid() != 0:
@@ -2748,63 +3690,96 @@ def main():
     
     try:
         conf = load_json(CONF_PATH)
+        # Доступ к BMC и тестовый пользователь нужны до первого шага (и очистке в finally)
+        missing_keys = [key for key in _CONF_REQUIRED_KEYS if key not in conf]
+        if missing_keys:
+            raise ValueError(f"В {CONF_PATH.name} отсутствуют параметры: {', '.join(missing_keys)}")
+        
+        # Одна сессия ipmitool shell на весь прогон вместо рукопожатия на каждую команду
+        IPMI_SESSION = IpmiSession(BmcConf.from_conf(conf))
+        IPMI_SESSION.open()
         RESULT_JSON['serial'] = get_serial_from_fru(conf)
         
         # КРИТИЧЕСКИ ВАЖНО: Инициализируем LOG_ROOT в самом начале
-        script_dir = Path(__file__).parent.absolute()
-        timestamp = dt.datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
-        LOG_ROOT = script_dir / 'logs' / f"{RESULT_JSON['serial']}_{timestamp}"
+        # Метка каталога - время старта прогона (то же, что RESULT_JSON['start'])
+        timestamp = _START_DT.strftime('%Y%m%d_%H%M%S')
+        LOG_ROOT = SCRIPT_DIR / 'logs' / f"{RESULT_JSON['serial']}_{timestamp}"
         LOG_ROOT.mkdir(parents=True, exist_ok=True)
         
-        # Теперь можно безопасно загружать остальные конфиги, используя run()
-        qvl  = load_json(REF_ROOT / 'firmware_versions.json')
-        reference = load_json(REF_ROOT / 'inventory_RSMB-MS93.json')
-        sensor_ref = load_json(REF_ROOT / 'sensor_limits.json')
+        # Эталоны разбираются (параллельно) до первого шага: битый файл отклоняет
+        # прогон здесь, а не после создания тестового пользователя BMC.
+        # load_json кэширует результат - шаги получают их без повторного разбора
+        qvl, reference, sensor_ref = run_concurrently([(load_json, QVL_PATH),
+                                                       (load_json, INVENTORY_PATH),
+                                                       (load_json, SENSOR_REF_PATH)])
     except (FileNotFoundError, ValueError) as e:
         RESULT_JSON['warnings'].append(f'Ошибка загрузки конфигурации: {e}')
         print(f'ОШИБКА: {e}', file=sys.stderr)
         sys.exit(1)
 
+    timed_out = False
+    max_run_sec = int(conf.get('max_run_sec', _MAX_RUN_SEC))
+    signal.signal(signal.SIGALRM, _run_watchdog)
+    signal.alarm(max_run_sec)
     try:
         # Основные этапы согласно ТТ с правильным порядком для SEL анализа
         step_init(conf)
-        step_bmc_fw(conf, qvl)
-        step_bios_fw(conf, qvl)
-        step_cpld_fpga_vrm_check(conf, qvl)
+        
+        # Проверки прошивок и CPLD/FPGA/VRM не зависят друг от друга - ожидание
+        # BMC, dmidecode и i2c шин перекрывается
+        run_concurrently([(step_bmc_fw, conf, qvl),
+                          (step_bios_fw, conf, qvl),
+                          (step_cpld_fpga_vrm_check, conf, qvl)])
         step_bmc_user(conf)
-        step_detailed_inventory(conf, reference)
-        step_riser_check(conf)
-        step_sensor_readings(conf, sensor_ref)
-        step_flash_macs_disabled(conf)
-        step_vga_test(conf)
-        step_fp1_test(conf)
-        step_i3c_scan(conf)
-        
-        # SEL анализ ДОЛЖЕН быть перед стресс-тестами для правильного before/after
-        # Но в текущей реализации step_sel_analyse имеет свой timing внутри
-        # Поэтому перемещаем его после стресс-тестов
-        step_stress(conf)
-        step_sel_analyse(conf)
         
-        # Очистка: удаляем тестового пользователя BMC
-        step_cleanup_bmc_user(conf)
+        # Проверки оборудования независимы по данным и пишут в свои логи; команды
+        # IPMI из разных потоков сериализуются общей сессией, результаты шагов
+        # попадают в разные ключи RESULT_JSON
+        run_concurrently([(step_detailed_inventory, conf, reference),
+                          (step_riser_check, conf),
+                          (step_sensor_readings, conf, sensor_ref),
+                          (step_flash_macs_disabled, conf),
+                          (step_vga_test, conf),
+                          (step_fp1_test, conf),
+                          (step_i3c_scan, conf)])
+        
+        # SEL BEFORE снимается до стресс-тестов, AFTER - после: в diff попадают
+        # события, возникшие во время стресса
+        sel_before, sel_marker = step_sel_before(conf)
+        step_stress(conf)
+        step_sel_analyse(conf, sel_before, sel_marker)
         step_hw_diff()
+    except RunTimeout as exc:
+        timed_out = True
+        RESULT_JSON['warnings'].append(f'{exc} (max_run_sec={max_run_sec})')
     except Exception as exc:
         RESULT_JSON['warnings'].append(str(exc))
+    finally:
+        signal.alarm(0)
+        # Очистка: тестовый пользователь BMC удаляется при любом исходе шагов,
+        # иначе он остаётся на плате с паролем из agent.conf
+        step_cleanup_bmc_user(conf)
+        IPMI_SESSION.close()
 
-    RESULT_JSON['end'] = dt.datetime.now(timezone.utc).isoformat()
-    RESULT_JSON['duration_sec'] = int(dt.datetime.fromisoformat(RESULT_JSON['end']).timestamp()
-                                      - dt.datetime.fromisoformat(RESULT_JSON['start']).timestamp())
+    # После watchdog потоки прерванных шагов ещё могут менять RESULT_JSON
+    report = _snapshot_result_json() if timed_out else RESULT_JSON
+    end_dt = dt.datetime.now(timezone.utc)
+    report['end'] = end_dt.isoformat()
+    report['duration_sec'] = int((end_dt - _START_DT).total_seconds())
 
     report_path = LOG_ROOT / 'report_stage2.json'
-    with report_path.open('w', encoding='utf-8') as f:
-        json.dump(RESULT_JSON, f, ensure_ascii=False, indent=2)
+    dump_json(report, report_path)
     
     # Выводим итоговую сводку
-    print_final_summary()
+    print_final_summary(report)
     
     print(f'\nREPORT json: {report_path}')
     print(f'LOGS directory: {LOG_ROOT}')
+    
+    if timed_out:
+        # Зависшие потоки шагов не ждём: обычный выход интерпретатора их join-ит
+        sys.stdout.flush()
+        os._exit(2)
 
 if __name__ == '__main__':
     main()